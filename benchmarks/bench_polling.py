@@ -0,0 +1,240 @@
+"""Offline benchmarks of a Greenely polling cycle.
+
+Run from the repository root, in an environment with Home Assistant
+installed:
+
+    python benchmarks/bench_polling.py --days 10 90 365 --cycles 3
+
+Every request is answered by MockGreenely, so nothing leaves the machine.
+For each window size the benchmark reports
+
+* api: one cycle of the requests the sensors need, made directly on
+  GreenelyApi, with its wall time, requests, bytes and peak memory, and
+  the hourly usage decoded whole and streamed,
+* coordinator: consecutive update cycles of GreenelyDataUpdateCoordinator,
+  which shows what the store and caches save after the first cycle,
+* sensors: the time, peak memory and attribute size of rendering each sensor
+  from a full window of data.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import json
+from pathlib import Path
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mock_greenely import MockGreenely  # noqa: E402
+
+from custom_components.greenely.api import GreenelyApi  # noqa: E402
+
+
+@dataclass
+class Result:
+    """Measurements of one benchmarked step."""
+
+    name: str
+    seconds: float
+    requests: int = 0
+    bytes: int = 0
+    peak: int = 0
+    size: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name:<40} {self.seconds * 1000:>9.2f} ms"
+            f" {self.requests:>5} req {self.bytes / 1024:>9.1f} KiB"
+            f" {self.peak / 1024:>9.1f} KiB peak {self.size / 1024:>9.1f} KiB attrs"
+        )
+
+
+async def measure(name: str, mock: MockGreenely, func) -> tuple[Result, object]:
+    """Run a coroutine function and measure it."""
+    mock.reset()
+    tracemalloc.start()
+    start = time.perf_counter()
+    value = await func()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return Result(name, seconds, mock.total_requests, mock.bytes, peak), value
+
+
+async def bench_api(days: int) -> list[Result]:
+    """Time the requests of one cycle made directly on the API."""
+    mock = MockGreenely()
+    api = GreenelyApi("user@example.com", "password", mock.client())
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=days)
+
+    async def cycle():
+        await api.check_auth()
+        await api.get_usage("12345", start, today, False)
+        await api.get_usage("12345", start, today, True)
+        await api.get_produced_electricity(
+            "12345", start, today + timedelta(days=1), False
+        )
+        await api.get_price_data("12345")
+        await api.get_spot_price("12345")
+
+    async def hourly_json():
+        api.cache.clear()
+        return len(await api.get_usage("12345", start, today, True))
+
+    async def hourly_stream():
+        return sum([1 async for _ in api.stream_usage("12345", start, today, True)])
+
+    results = []
+    for label in ("cold", "warm"):
+        result, _ = await measure(f"api {days}d cycle ({label})", mock, cycle)
+        results.append(result)
+    for label, func in (("json", hourly_json), ("stream", hourly_stream)):
+        result, _ = await measure(f"api {days}d hourly usage ({label})", mock, func)
+        results.append(result)
+    return results
+
+
+async def bench_coordinator(days: int, cycles: int) -> list[Result]:
+    """Time consecutive update cycles of a facility coordinator."""
+    from homeassistant.core import HomeAssistant
+
+    from custom_components.greenely.const import (
+        GREENELY_DAILY_PRODUCED_ELECTRICITY,
+        GREENELY_HOURLY_OFFSET_DAYS,
+        GREENELY_HOURLY_USAGE,
+        GREENELY_PRODUCED_ELECTRICITY_DAYS,
+        GREENELY_USAGE_DAYS,
+    )
+    from custom_components.greenely.coordinator import GreenelyDataUpdateCoordinator
+    from custom_components.greenely.store import GreenelyStore
+
+    mock = MockGreenely()
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        entry = SimpleNamespace(
+            entry_id="benchmark",
+            data={},
+            options={
+                GREENELY_USAGE_DAYS: days,
+                GREENELY_HOURLY_USAGE: True,
+                GREENELY_HOURLY_OFFSET_DAYS: days,
+                GREENELY_DAILY_PRODUCED_ELECTRICITY: True,
+                GREENELY_PRODUCED_ELECTRICITY_DAYS: days,
+            },
+        )
+        api = GreenelyApi("user@example.com", "password", mock.client())
+        store = GreenelyStore(hass, entry.entry_id)
+        coordinator = GreenelyDataUpdateCoordinator(hass, entry, api, store, "12345")
+
+        results = []
+        for cycle in range(1, cycles + 1):
+            result, _ = await measure(
+                f"coordinator {days}d cycle {cycle}",
+                mock,
+                coordinator._async_update_data,
+            )
+            results.append(result)
+        return results
+
+
+async def bench_sensors(days: int) -> list[Result]:
+    """Time rendering each sensor from a full window of data."""
+    from custom_components.greenely.coordinator import GreenelyCoordinatorData
+    from custom_components.greenely.formatting import LocaltimeFormatter
+    from custom_components.greenely.sensor import (
+        GreenelyDailyProducedElecticitySensor,
+        GreenelyDailyUsageSensor,
+        GreenelyHourlyUsageSensor,
+        GreenelyPricesSensor,
+    )
+
+    mock = MockGreenely()
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = today - timedelta(days=days)
+    hour = timedelta(hours=1)
+    day = timedelta(days=1)
+    coordinator = SimpleNamespace(
+        statistics=False,
+        sensor_metrics={},
+        spot_price_step=3600,
+        data=GreenelyCoordinatorData(
+            daily_usage=mock.series("consumption_daily", start, today, day),
+            hourly_usage=mock.series("consumption_hourly", start, today, hour),
+            produced_electricity=mock.series(
+                "produced_electricity", start, today + day, day
+            ),
+            price_data=mock.series(
+                "consumption_currency", today.replace(day=1), today, day
+            ),
+            spot_price={
+                "data": mock.series("spot_price", today - day, today + 2 * day, hour)
+            },
+        ),
+    )
+    formatter = LocaltimeFormatter("%b %d %Y", "%H:%M")
+    sensors = {
+        "daily usage": GreenelyDailyUsageSensor,
+        "hourly usage": GreenelyHourlyUsageSensor,
+        "produced electricity": GreenelyDailyProducedElecticitySensor,
+    }
+
+    results = []
+    for label, cls in sensors.items():
+        sensor = cls(label, coordinator, "12345", formatter)
+        results.append(await _render(f"sensor {label} {days}d", mock, sensor))
+    sensor = GreenelyPricesSensor("prices", coordinator, "12345", formatter, False, [3])
+    results.append(await _render(f"sensor prices {days}d", mock, sensor))
+
+    quarter = timedelta(minutes=15)
+    coordinator.spot_price_step = 900
+    coordinator.data.spot_price = {
+        "data": mock.series("spot_price", today - day, today + 2 * day, quarter)
+    }
+    sensor = GreenelyPricesSensor("prices", coordinator, "12345", formatter, False, [3])
+    results.append(await _render(f"sensor prices 15min {days}d", mock, sensor))
+    return results
+
+
+async def _render(name: str, mock: MockGreenely, sensor) -> Result:
+    async def render():
+        sensor._update_from_data()
+
+    result, _ = await measure(name, mock, render)
+    result.size = len(json.dumps(sensor.extra_state_attributes, default=str))
+    return result
+
+
+async def main(days_list: list[int], cycles: int) -> None:
+    """Run all benchmarks and print their results."""
+    for days in days_list:
+        for bench in (
+            bench_api(days),
+            bench_coordinator(days, cycles),
+            bench_sensors(days),
+        ):
+            try:
+                results = await bench
+            except ImportError as err:
+                print(f"skipped, {err}")
+                continue
+            for result in results:
+                print(result)
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[10, 90, 365])
+    parser.add_argument("--cycles", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.days, args.cycles))
@@ -0,0 +1,161 @@
+"""Offline stand-in for the Greenely API, served through httpx.MockTransport.
+
+The fixtures in fixtures/ have the shape of recorded API responses. Ranged
+endpoints use the first non-empty point of their fixture as a template and
+repeat it for every hour or day of the requested range, so the payloads
+grow like the real ones. Ranged responses carry an ETag, and a request
+that sends it back in If-None-Match gets an empty 304 response. Failures
+can be injected per endpoint with fail_next.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime, timedelta
+import hashlib
+import json
+from pathlib import Path
+import random
+
+import httpx
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def load_fixture(name: str) -> dict:
+    """Return a fixture payload."""
+    return json.loads((FIXTURES / f"{name}.json").read_text())
+
+
+def _template(name: str) -> dict:
+    return next(
+        point
+        for point in load_fixture(name)["data"].values()
+        if all(value is not None for value in point.values())
+    )
+
+
+def _parse_date(value: str) -> datetime:
+    # get_usage does not zero pad the day, so strptime is not used here
+    year, month, day = (int(part) for part in value.split("-"))
+    return datetime(year, month, day)
+
+
+class MockGreenely:
+    """Serve fixture payloads and count what goes over the wire."""
+
+    def __init__(self, seed: int = 1) -> None:
+        self.requests: Counter[str] = Counter()
+        # Endpoint -> how many of its next requests fail with a 503
+        self.fail_next: Counter[str] = Counter()
+        self.bytes = 0
+        self._random = random.Random(seed)
+        self._payloads: dict[tuple, bytes] = {}
+        self._templates = {
+            name: _template(name)
+            for name in (
+                "consumption_daily",
+                "consumption_hourly",
+                "consumption_currency",
+                "spot_price",
+                "produced_electricity",
+            )
+        }
+
+    def reset(self) -> None:
+        """Reset the request and byte counters."""
+        self.requests.clear()
+        self.bytes = 0
+
+    @property
+    def total_requests(self) -> int:
+        """Return the number of requests since the last reset."""
+        return sum(self.requests.values())
+
+    def transport(self) -> httpx.MockTransport:
+        """Return a transport for an httpx.AsyncClient."""
+        return httpx.MockTransport(self.handle)
+
+    def client(self) -> httpx.AsyncClient:
+        """Return a client that talks to this mock."""
+        return httpx.AsyncClient(transport=self.transport())
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer a request like api2.greenely.com would."""
+        endpoint = request.url.path.rstrip("/").rsplit("/", 1)[-1]
+        self.requests[endpoint] += 1
+        if self.fail_next[endpoint] > 0:
+            self.fail_next[endpoint] -= 1
+            return self._respond(
+                httpx.codes.SERVICE_UNAVAILABLE, {"error": "unavailable"}
+            )
+
+        if endpoint == "login":
+            return self._respond(httpx.codes.OK, load_fixture("login"))
+        if endpoint == "checkauth":
+            return self._respond(httpx.codes.OK, load_fixture("checkauth"))
+        if endpoint == "facilities":
+            return self._respond(httpx.codes.OK, load_fixture("facilities"))
+
+        params = request.url.params
+        start = _parse_date(params["from"])
+        end = _parse_date(params["to"])
+        step = {
+            "hourly": timedelta(hours=1),
+            "quarter_hourly": timedelta(minutes=15),
+        }.get(params.get("resolution"), timedelta(days=1))
+        if endpoint == "consumption":
+            name = (
+                "consumption_currency"
+                if params.get("unit") == "currency"
+                else ("consumption_hourly" if step.days == 0 else "consumption_daily")
+            )
+        elif endpoint in ("spot-price", "produced-electricity"):
+            name = endpoint.replace("-", "_")
+        else:
+            return self._respond(httpx.codes.NOT_FOUND, {"error": "not found"})
+        # Generating a payload is the mock's own cost, so it is only paid once
+        key = (name, start, end, step)
+        if key not in self._payloads:
+            self._payloads[key] = json.dumps(
+                {"data": self.series(name, start, end, step)}
+            ).encode()
+        payload = self._payloads[key]
+        etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(httpx.codes.NOT_MODIFIED, headers={"ETag": etag})
+        return self._respond_raw(httpx.codes.OK, payload, {"ETag": etag})
+
+    def series(self, name: str, start: datetime, end: datetime, step) -> dict:
+        """Return the data of a ranged endpoint, keyed like the real API."""
+        template = self._templates[name]
+        data = {}
+        now = datetime.now()
+        moment = start
+        while moment < end:
+            point = dict(template)
+            point["localtime"] = moment.strftime("%Y-%m-%d %H:%M")
+            for key, value in template.items():
+                if isinstance(value, int):
+                    published = moment < now or name == "spot_price"
+                    point[key] = (
+                        int(value * self._random.uniform(0.5, 1.5))
+                        if published
+                        else None
+                    )
+            data[str(int(moment.timestamp()))] = point
+            moment += step
+        return data
+
+    def _respond(self, status: int, payload: dict) -> httpx.Response:
+        return self._respond_raw(status, json.dumps(payload).encode())
+
+    def _respond_raw(
+        self, status: int, content: bytes, headers: dict | None = None
+    ) -> httpx.Response:
+        self.bytes += len(content)
+        return httpx.Response(
+            status,
+            content=content,
+            headers={"Content-Type": "application/json", **(headers or {})},
+        )
@@ -2,15 +2,37 @@
 
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
+import logging
+
+import httpx
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_EMAIL, CONF_PASSWORD, Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    CONF_EMAIL,
+    CONF_PASSWORD,
+    EVENT_HOMEASSISTANT_CLOSE,
+    Platform,
+)
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.util.ssl import get_default_context
 
 from .services import async_setup_services
-from .api import GreenelyApi
-from .const import GREENELY_FACILITY_ID
+from .api import GreenelyApi, create_client
+from .const import (
+    DOMAIN,
+    GREENELY_ALL_FACILITIES,
+    GREENELY_DATE_FORMAT,
+    GREENELY_FACILITY_ID,
+    GREENELY_TIME_FORMAT,
+)
+from .coordinator import GreenelyDataUpdateCoordinator
+from .formatting import LocaltimeFormatter
+from .store import GreenelyStore
+
+_LOGGER = logging.getLogger(__name__)
 
 PLATFORMS: list[Platform] = [Platform.SENSOR]
 
@@ -24,35 +46,167 @@ class GreenelyData:
 
     api: GreenelyApi
     facilitiyId: int
+    coordinators: dict[str, GreenelyDataUpdateCoordinator]
+    formatter: LocaltimeFormatter
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: GreenelyConfigEntry) -> bool:
-    """Set up Greenely from a config entry."""
-
-    email = entry.data[CONF_EMAIL]
-    password = entry.data[CONF_PASSWORD]
+    """Set up Greenely from a config entry.
 
-    api = GreenelyApi(email, password)
+    Setup does not wait for the network when it can be avoided. The sensors
+    start from the data kept in the store, and the first refresh runs in the
+    background. The API session outlives reloads of the entry, so changing
+    the options does not log in again.
+    """
 
     entry.async_on_unload(entry.add_update_listener(async_update_options))
 
-    if api.check_auth():
-        facilityId = (
-            api.get_facility_id()
-            if entry.data.get(GREENELY_FACILITY_ID, "") == ""
-            else entry.data[GREENELY_FACILITY_ID]
+    store = GreenelyStore(hass, entry.entry_id)
+    await store.async_load()
+    # A reload loads the store again, so what is pending must be saved first
+    entry.async_on_unload(store.async_flush)
+    account = store.account()
+
+    api = _async_get_session(hass, entry, store)
+
+    facilityId = entry.data.get(GREENELY_FACILITY_ID, "") or account.get(
+        "facility_id", ""
+    )
+    if facilityId == "":
+        # Only entries created without a facility id have to ask for it
+        try:
+            if not await api.check_auth():
+                raise ConfigEntryNotReady("Unable to log in")
+            facilityId = await api.get_facility_id()
+        except httpx.HTTPError as err:
+            raise ConfigEntryNotReady(f"Unable to reach Greenely: {err}") from err
+        if facilityId is None:
+            raise ConfigEntryNotReady("Unable to fetch the facility id")
+        account["facility_id"] = facilityId
+        store.async_schedule_save()
+
+    all_facilities = entry.options.get(GREENELY_ALL_FACILITIES, False)
+    facility_ids = [str(entry.options.get(GREENELY_FACILITY_ID, facilityId))]
+    if all_facilities:
+        if "facilities" not in account:
+            await _async_update_facilities(api, store)
+        for facility_id in account.get("facilities", []):
+            if facility_id not in facility_ids:
+                facility_ids.append(facility_id)
+
+    coordinators = {
+        facility_id: GreenelyDataUpdateCoordinator(hass, entry, api, store, facility_id)
+        for facility_id in facility_ids
+    }
+    for coordinator in coordinators.values():
+        coordinator.async_restore()
+        entry.async_on_unload(coordinator.async_start_schedule())
+    formatter = LocaltimeFormatter(
+        entry.options.get(GREENELY_DATE_FORMAT, "%b %d %Y"),
+        entry.options.get(GREENELY_TIME_FORMAT, "%H:%M"),
+    )
+    entry.runtime_data = GreenelyData(api, facilityId, coordinators, formatter)
+    await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    async def _async_first_refresh() -> None:
+        # All facilities share the api session, and are fetched concurrently
+        await asyncio.gather(
+            *(coordinator.async_refresh() for coordinator in coordinators.values())
         )
-        entry.runtime_data = GreenelyData(api, facilityId)
-        await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+        if all_facilities and await _async_update_facilities(api, store):
+            hass.config_entries.async_schedule_reload(entry.entry_id)
+
+    entry.async_create_background_task(
+        hass, _async_first_refresh(), f"{DOMAIN} first refresh {entry.entry_id}"
+    )
 
     await async_setup_services(hass)
     return True
 
 
+@callback
+def _async_get_session(
+    hass: HomeAssistant, entry: GreenelyConfigEntry, store: GreenelyStore
+) -> GreenelyApi:
+    """Return the API session of an entry.
+
+    The session of a previous setup is reused, and otherwise the jwt kept in
+    the store, so a restart while it is valid does not log in again.
+    """
+    email = entry.data[CONF_EMAIL]
+    password = entry.data[CONF_PASSWORD]
+    account = store.account()
+
+    @callback
+    def _async_save_session() -> None:
+        account["session"] = {"email": email, **api.session()}
+        store.async_schedule_save()
+
+    sessions: dict[str, GreenelyApi] = hass.data.setdefault(DOMAIN, {})
+    api = sessions.get(entry.entry_id)
+    if api is not None and api.has_credentials(email, password):
+        api.on_login = _async_save_session
+        return api
+    if api is not None:
+        hass.async_create_task(api.async_close())
+
+    client = create_client(get_default_context())
+    api = GreenelyApi(email, password, client)
+    session = account.get("session", {})
+    if session.get("email") == email:
+        api.restore_session(session)
+    api.on_login = _async_save_session
+    sessions[entry.entry_id] = api
+
+    async def _async_close(event: Event) -> None:
+        await client.aclose()
+
+    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, _async_close)
+    return api
+
+
+async def _async_update_facilities(api: GreenelyApi, store: GreenelyStore) -> bool:
+    """Store the facility ids of the account, returning True if they changed."""
+    try:
+        if not await api.check_auth():
+            return False
+        facilities = await api.get_facility_ids()
+    except httpx.HTTPError as err:
+        _LOGGER.warning("Unable to fetch the facilities, %s", err)
+        return False
+    if facilities is None:
+        return False
+    account = store.account()
+    facility_ids = [str(facility["id"]) for facility in facilities]
+    changed = account.get("facilities") != facility_ids
+    account["facilities"] = facility_ids
+    store.async_schedule_save()
+    return changed
+
+
 async def async_update_options(hass: HomeAssistant, entry: GreenelyConfigEntry):
     await hass.config_entries.async_reload(entry.entry_id)
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: GreenelyConfigEntry) -> bool:
-    """Unload a config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    """Unload a config entry.
+
+    The API session is kept for the setup that follows a reload, and closed
+    with its pooled connections when the entry is disabled.
+    """
+    unloaded = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
+    if unloaded and entry.disabled_by is not None:
+        await _async_close_session(hass, entry)
+    return unloaded
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: GreenelyConfigEntry) -> None:
+    """Remove the stored data and the API session of a config entry."""
+    await _async_close_session(hass, entry)
+    await GreenelyStore(hass, entry.entry_id).async_remove()
+
+
+async def _async_close_session(hass: HomeAssistant, entry: GreenelyConfigEntry) -> None:
+    api = hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
+    if api is not None:
+        await api.async_close()
@@ -1,17 +1,105 @@
 """Greenely API"""
 
+import asyncio
+import base64
+from collections import deque
+from collections.abc import Callable
+import codecs
+from contextlib import aclosing
 from datetime import datetime, timedelta
 import json
 import logging
+import ssl
+import time
 
 import httpx
 
+from .cache import ResponseCache, endpoint
+from .metrics import ApiMetrics
+from .streaming import iter_data
+from .resilience import (
+    MAX_RETRIES,
+    MAX_RETRY_DELAY,
+    CircuitBreaker,
+    CircuitOpenError,
+    backoff_delay,
+    is_transient,
+    retry_after,
+)
+
 _LOGGER = logging.getLogger(__name__)
 
+MAX_CONNECTIONS = 10
+MAX_KEEPALIVE_CONNECTIONS = 5
+MAX_CONCURRENT_REQUESTS = 4
+KEEPALIVE_EXPIRY = 120
+CONNECT_TIMEOUT = 10
+REQUEST_TIMEOUT = 30
+TOKEN_REFRESH_MARGIN = 300
+
+# Longer usage and production ranges are split into chunks of these days
+HOURLY_CHUNK_DAYS = 31
+DAILY_CHUNK_DAYS = 366
+# Chunks of one range that are fetched at the same time
+MAX_CONCURRENT_CHUNKS = 3
+# Times a failed chunk is fetched before the whole range fails
+CHUNK_ATTEMPTS = 2
+
+
+def create_client(verify: ssl.SSLContext | bool = True) -> httpx.AsyncClient:
+    """Create a long-lived, connection pooling client for the Greenely API."""
+    return httpx.AsyncClient(
+        verify=verify,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+def decode_jwt_expiry(jwt: str) -> float | None:
+    """Return the exp claim of a JWT, without verifying its signature."""
+    try:
+        payload = jwt.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def split_range(start, end, days):
+    """Split a range into consecutive chunks of at most days."""
+    chunks = []
+    while start < end:
+        chunk_end = min(start + timedelta(days=days), end)
+        chunks.append((start, chunk_end))
+        start = chunk_end
+    return chunks or [(start, end)]
+
+
+async def _in_order(calls, limit=MAX_CONCURRENT_CHUNKS):
+    """Run calls, at most limit at a time, and yield their results in order."""
+    pending: deque[asyncio.Future] = deque()
+    try:
+        for call in calls:
+            pending.append(asyncio.ensure_future(call()))
+            if len(pending) >= limit:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
 
 class GreenelyApi:
-    def __init__(self, email, password):
+    def __init__(self, email, password, client: httpx.AsyncClient):
+        self._client = client
         self._jwt = ""
+        self._jwt_expires_at: float | None = None
+        self._login_lock = asyncio.Lock()
         self._url_check_auth = "https://api2.greenely.com/v1/checkauth"
         self._url_login = "https://api2.greenely.com/v1/login"
         self._url_data = "https://api2.greenely.com/v3/data/"
@@ -24,72 +112,380 @@ class GreenelyApi:
         }
         self._email = email
         self._password = password
-        self._facility_id = "primary"
+        self._request_limit = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.cache = ResponseCache()
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self.metrics = ApiMetrics()
+        # Called after each successful login, to save the new session
+        self.on_login: Callable[[], None] | None = None
+
+    async def async_close(self) -> None:
+        """Close the connections of the session."""
+        await self._client.aclose()
+
+    def has_credentials(self, email, password) -> bool:
+        """Return True if this session logs in with the given credentials."""
+        return self._email == email and self._password == password
+
+    def session(self) -> dict:
+        """Return the jwt and its expiry, to be restored after a restart."""
+        return {"jwt": self._jwt, "expires_at": self._jwt_expires_at}
+
+    def restore_session(self, session: dict) -> None:
+        """Use the jwt of an earlier session instead of logging in."""
+        self._jwt = session.get("jwt", "")
+        self._jwt_expires_at = session.get("expires_at")
+        self._headers["Authorization"] = self._jwt
+
+    @property
+    def token_valid(self) -> bool:
+        """Return True if the jwt is known to be valid for a while longer."""
+        return (
+            self._jwt != ""
+            and self._jwt_expires_at is not None
+            and time.time() < self._jwt_expires_at - TOKEN_REFRESH_MARGIN
+        )
+
+    async def _get(self, url, headers=None, stream=False):
+        """GET an authenticated url, retrying transient failures.
+
+        Timeouts, connection errors, 5xx and 429 responses are retried with
+        exponential backoff and jitter, or after the delay that a Retry-After
+        header asks for. The last failed response is returned, or its error
+        raised, once the retries run out. With stream, the body of a 200
+        response is left unread and the caller has to close the response.
+        """
+        return await self._with_retries(
+            url, lambda: self._send(url, headers, stream), stream
+        )
+
+    async def _auth_request(self, method, url, content=None):
+        """Send a login or jwt check, retrying transient failures.
+
+        Unlike _get, a rejected jwt is returned as is instead of logging in.
+        """
+
+        async def send():
+            async with self._request_limit:
+                return await self._request(url, None, False, method, content)
+
+        return await self._with_retries(url, send)
 
-    def set_facility_id(self, facility_id) -> None:
-        _LOGGER.debug("Setting facility id to %s", facility_id)
-        self._facility_id = str(facility_id)
+    async def _with_retries(self, url, send, stream=False):
+        host = httpx.URL(url).host
+        name = endpoint(url)
+        breaker = self._breakers.setdefault(host, CircuitBreaker())
+        # The retries belong to the request, so they are neither rejected by
+        # the circuit nor counted as failures of their own
+        breaker.check(host)
+        for attempt in range(MAX_RETRIES + 1):
+            started = time.monotonic()
+            try:
+                response = await send()
+                unread = stream and response.status_code == httpx.codes.OK
+                if stream and not unread:
+                    await response.aread()
+            except httpx.TransportError as err:
+                self.metrics.record_error(name)
+                if attempt == MAX_RETRIES:
+                    breaker.record_failure()
+                    raise
+                delay = backoff_delay(attempt)
+                _LOGGER.debug("Request failed, %s, retrying in %.1f s", err, delay)
+            else:
+                self.metrics.record_request(
+                    name,
+                    time.monotonic() - started,
+                    0 if unread else len(response.content),
+                    response.status_code < httpx.codes.BAD_REQUEST,
+                )
+                if not is_transient(response):
+                    breaker.record_success()
+                    return response
+                delay = retry_after(response)
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                if attempt == MAX_RETRIES or delay > MAX_RETRY_DELAY:
+                    breaker.record_failure()
+                    return response
+                _LOGGER.debug("Got %s, retrying in %.1f s", response.status_code, delay)
+            self.metrics.record_retry(name)
+            await asyncio.sleep(delay)
+
+    async def _send(self, url, headers=None, stream=False):
+        """GET an authenticated url, logging in again if the jwt is rejected."""
+        async with self._request_limit:
+            jwt = self._jwt
+            response = await self._request(url, headers, stream)
+        if response.status_code == httpx.codes.UNAUTHORIZED:
+            _LOGGER.debug("jwt was rejected, logging in again")
+            await response.aclose()
+            if await self._relogin(jwt):
+                async with self._request_limit:
+                    response = await self._request(url, headers, stream)
+        return response
+
+    async def _request(self, url, headers, stream, method="GET", content=None):
+        request = self._client.build_request(
+            method, url, headers={**self._headers, **(headers or {})}, content=content
+        )
+        return await self._client.send(request, stream=stream)
+
+    async def _stream_data(self, url, error):
+        """Yield the points of a response while its body is decoded.
+
+        Raises httpx.HTTPStatusError, after logging error, if it failed.
+        """
+        response = await self._get(url, stream=True)
+        size = 0
+
+        async def text():
+            nonlocal size
+            decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                yield decoder.decode(chunk)
+            yield decoder.decode(b"", final=True)
+
+        try:
+            if response.status_code != httpx.codes.OK:
+                _LOGGER.error(error, response.text)
+                response.raise_for_status()
+            async for _, point in iter_data(text()):
+                yield point
+        finally:
+            await response.aclose()
+            self.metrics.record_bytes(endpoint(url), size)
+
+    async def _get_range(self, make_url, startDate, endDate, showHourly, error):
+        """Fetch the data of a range, splitting a long one into chunks.
+
+        The chunks are fetched concurrently and merged in order. A chunk that
+        fails is fetched again on its own, and if it keeps failing the error
+        is logged and nothing is returned for the range.
+        """
+        days = HOURLY_CHUNK_DAYS if showHourly else DAILY_CHUNK_DAYS
+        urls = [make_url(s, e) for s, e in split_range(startDate, endDate, days)]
+        merged = {}
+        async with aclosing(
+            _in_order(lambda url=url: self._get_chunk(url, error) for url in urls)
+        ) as chunks:
+            async for data in chunks:
+                if data is None:
+                    return {}
+                merged.update(data["data"])
+        return merged
+
+    async def _get_chunk(self, url, error):
+        for attempt in range(1, CHUNK_ATTEMPTS + 1):
+            try:
+                response, data = await self._get_json(url)
+            except CircuitOpenError:
+                raise
+            except httpx.HTTPError as err:
+                if attempt == CHUNK_ATTEMPTS:
+                    raise
+                _LOGGER.debug("Fetching %s again, %s", url, err)
+                continue
+            if data is not None:
+                return data
+            if attempt == CHUNK_ATTEMPTS:
+                _LOGGER.error(error, response.text)
+                return None
+            _LOGGER.debug("Fetching %s again", url)
 
-    def get_price_data(self):
+    async def _stream_range(
+        self, make_url, startDate, endDate, showHourly, error, value_key
+    ):
+        """Yield the (localtime, value) points of a range, chunk by chunk.
+
+        A range that fits in one chunk is streamed as it is decoded. The
+        chunks of a longer range are fetched concurrently, and only the
+        points of those chunks are held until it is their turn.
+        """
+        days = HOURLY_CHUNK_DAYS if showHourly else DAILY_CHUNK_DAYS
+        urls = [make_url(s, e) for s, e in split_range(startDate, endDate, days)]
+        if len(urls) == 1:
+            async with aclosing(self._stream_data(urls[0], error)) as points:
+                async for point in points:
+                    yield point["localtime"], point[value_key]
+            return
+        async with aclosing(
+            _in_order(
+                lambda url=url: self._collect_chunk(url, error, value_key)
+                for url in urls
+            )
+        ) as chunks:
+            async for points in chunks:
+                for point in points:
+                    yield point
+
+    async def _collect_chunk(self, url, error, value_key):
+        for attempt in range(1, CHUNK_ATTEMPTS + 1):
+            try:
+                async with aclosing(self._stream_data(url, error)) as points:
+                    return [
+                        (point["localtime"], point[value_key]) async for point in points
+                    ]
+            except CircuitOpenError:
+                raise
+            except (httpx.HTTPError, ValueError) as err:
+                if attempt == CHUNK_ATTEMPTS:
+                    raise
+                _LOGGER.debug("Fetching %s again, %s", url, err)
+
+    async def _get_json(self, url):
+        """GET a url, joining an identical request that is already in flight.
+
+        Returns the response and its parsed json, or None as json if the
+        request failed. A fresh cached json is returned without a response.
+        Callers share the parsed json, so it must not be modified.
+        """
+        data = self.cache.fresh(url)
+        if data is not None:
+            return None, data
+        request = self._in_flight.get(url)
+        if request is None:
+            request = asyncio.ensure_future(self._fetch_json(url))
+            self._in_flight[url] = request
+            request.add_done_callback(lambda _: self._in_flight.pop(url, None))
+        else:
+            _LOGGER.debug("Joining the request in flight for %s", url)
+        # A caller that is cancelled must not cancel the request of the others
+        return await asyncio.shield(request)
+
+    async def _fetch_json(self, url):
+        response = await self._get(url, self.cache.validators(url))
+        if response.status_code == httpx.codes.NOT_MODIFIED:
+            return response, self.cache.revalidated(url)
+        if response.status_code == httpx.codes.ok:
+            data = response.json()
+            self.cache.store(url, response, data)
+            return response, data
+        return response, None
+
+    async def _relogin(self, stale_jwt) -> bool:
+        """Login once for all callers that saw the same stale jwt."""
+        async with self._login_lock:
+            if self._jwt != stale_jwt:
+                _LOGGER.debug("jwt was already renewed by another caller")
+                return self._jwt != ""
+            return await self.login()
+
+    async def get_price_data(self, facility_id, startDate=None):
         today = datetime.today()
+        if startDate is None:
+            startDate = today.replace(day=1)
         nextMonth = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
-        start = "?from=" + str(today.year) + "-" + today.strftime("%m") + "-01"
+        start = "?from=" + startDate.strftime("%Y-%m-%d")
         end = "&to=" + str(nextMonth.year) + "-" + nextMonth.strftime("%m") + "-01"
         url = (
             self._url_facilities_base
-            + self._facility_id
+            + str(facility_id)
             + "/consumption"
             + start
             + end
             + "&resolution=daily&unit=currency&operation=sum"
         )
-        response = httpx.get(url, headers=self._headers)
-        data = {}
-        if response.status_code == httpx.codes.ok:
-            data = response.json()
+        response, data = await self._get_json(url)
+        if data is not None:
             return data["data"]
         else:
             _LOGGER.error("Failed to get price data, %s", response.text)
-            return data
+            return {}
 
-    def get_spot_price(self):
+    async def get_spot_price(
+        self, facility_id, startDate=None, endDate=None, resolution="hourly"
+    ):
         today = datetime.today()
-        yesterday = today - timedelta(days=1)
-        tomorrow = today + timedelta(days=2)
+        if startDate is None:
+            startDate = today - timedelta(days=1)
+        if endDate is None:
+            endDate = today + timedelta(days=2)
+        url = self._spot_price_url(facility_id, startDate, endDate, resolution)
+        response, data = await self._get_json(url)
+        if data is not None:
+            return data
+        else:
+            _LOGGER.error("Failed to get spot price data, %s", response.text)
+            return {}
+
+    async def stream_spot_price(self, facility_id, startDate, endDate):
+        """Yield the hourly (localtime, price) points of a range as they arrive.
+
+        Unlike get_spot_price, the response is neither cached nor shared.
+        """
+        async with aclosing(
+            self._stream_range(
+                lambda s, e: self._spot_price_url(facility_id, s, e, "hourly"),
+                startDate,
+                endDate,
+                True,
+                "Failed to get spot price data, %s",
+                "price",
+            )
+        ) as points:
+            async for point in points:
+                yield point
+
+    def _spot_price_url(self, facility_id, startDate, endDate, resolution):
         start = (
             "?from="
-            + str(yesterday.year)
+            + str(startDate.year)
             + "-"
-            + yesterday.strftime("%m")
+            + startDate.strftime("%m")
             + "-"
-            + yesterday.strftime("%d")
+            + startDate.strftime("%d")
         )
         end = (
             "&to="
-            + str(tomorrow.year)
+            + str(endDate.year)
             + "-"
-            + tomorrow.strftime("%m")
+            + endDate.strftime("%m")
             + "-"
-            + tomorrow.strftime("%d")
+            + endDate.strftime("%d")
         )
         url = (
             self._url_facilities_base
-            + self._facility_id
+            + str(facility_id)
             + "/spot-price"
             + start
             + end
-            + "&resolution=hourly"
+            + "&resolution="
+            + resolution
         )
-        response = httpx.get(url, headers=self._headers)
-        data = {}
-        if response.status_code == httpx.codes.ok:
-            data = response.json()
-            return data
-        else:
-            _LOGGER.error("Failed to get spot price data, %s", response.text)
-            return data
+        return url
 
-    def get_usage(self, startDate, endDate, showHourly):
+    async def get_usage(self, facility_id, startDate, endDate, showHourly):
+        return await self._get_range(
+            lambda s, e: self._usage_url(facility_id, s, e, showHourly),
+            startDate,
+            endDate,
+            showHourly,
+            "Failed to fetch usage data, %s",
+        )
+
+    async def stream_usage(self, facility_id, startDate, endDate, showHourly):
+        """Yield the (localtime, usage) points of a range as they arrive.
+
+        Unlike get_usage, the response is neither cached nor shared, and the
+        whole data mapping is never held in memory.
+        """
+        async with aclosing(
+            self._stream_range(
+                lambda s, e: self._usage_url(facility_id, s, e, showHourly),
+                startDate,
+                endDate,
+                showHourly,
+                "Failed to fetch usage data, %s",
+                "usage",
+            )
+        ) as points:
+            async for point in points:
+                yield point
+
+    def _usage_url(self, facility_id, startDate, endDate, showHourly):
         start = (
             "?from="
             + str(startDate.year)
@@ -109,47 +505,70 @@ class GreenelyApi:
         resolution = "hourly" if showHourly else "daily"
         url = (
             self._url_facilities_base
-            + self._facility_id
+            + str(facility_id)
             + "/consumption"
             + start
             + end
             + "&resolution="
             + resolution
         )
-        response = httpx.get(url, headers=self._headers)
-        data = {}
-        if response.status_code == httpx.codes.ok:
-            data = response.json()
-            return data["data"]
-        else:
-            _LOGGER.error("Failed to fetch usage data, %s", response.text)
-            return data
+        return url
 
-    def get_facility_id(self):
-        result = httpx.get(self._url_facilities_base, headers=self._headers)
-        if result.status_code == httpx.codes.ok:
-            data = result.json()["data"]
+    async def get_facility_id(self):
+        result, data = await self._get_json(self._url_facilities_base)
+        if data is not None:
+            data = data["data"]
             facility = next((f for f in data if f["is_primary"] == True), None)
             if facility == None:
                 _LOGGER.debug(
                     "Found no primary facility, using the first one in the list!"
                 )
                 facility = data[0]
-            self._facility_id = str(data[0]["id"])
-            _LOGGER.debug("Fetched facility id %s", self._facility_id)
-            return self._facility_id
+            facility_id = str(facility["id"])
+            _LOGGER.debug("Fetched facility id %s", facility_id)
+            return facility_id
         else:
-            _LOGGER.error("Failed to fetch facility id %s", result.reason)
+            _LOGGER.error("Failed to fetch facility id %s", result.reason_phrase)
 
-    def get_facility_ids(self):
-        result = httpx.get(self._url_facilities_base, headers=self._headers)
-        if result.status_code == httpx.codes.ok:
-            data = result.json()["data"]
-            return data
+    async def get_facility_ids(self):
+        result, data = await self._get_json(self._url_facilities_base)
+        if data is not None:
+            return data["data"]
         else:
             _LOGGER.error("Failed to fetch facility ids %s", result)
 
-    def get_produced_electricity(self, startDate, endDate, showHourly):
+    async def get_produced_electricity(
+        self, facility_id, startDate, endDate, showHourly
+    ):
+        _LOGGER.debug("Fetching produced electicity from %s to %s", startDate, endDate)
+        return await self._get_range(
+            lambda s, e: self._produced_electricity_url(facility_id, s, e, showHourly),
+            startDate,
+            endDate,
+            showHourly,
+            "Failed to fetch produced electricity data, %s",
+        )
+
+    async def stream_produced_electricity(
+        self, facility_id, startDate, endDate, showHourly
+    ):
+        """Yield the (localtime, value) points of a range as they arrive."""
+        async with aclosing(
+            self._stream_range(
+                lambda s, e: self._produced_electricity_url(
+                    facility_id, s, e, showHourly
+                ),
+                startDate,
+                endDate,
+                showHourly,
+                "Failed to fetch produced electricity data, %s",
+                "value",
+            )
+        ) as points:
+            async for point in points:
+                yield point
+
+    def _produced_electricity_url(self, facility_id, startDate, endDate, showHourly):
         start = (
             "?from="
             + str(startDate.year)
@@ -169,56 +588,48 @@ class GreenelyApi:
         resolution = "hourly" if showHourly else "daily"
         url = (
             self._url_facilities_base
-            + self._facility_id
+            + str(facility_id)
             + "/produced-electricity"
             + start
             + end
             + "&resolution="
             + resolution
         )
-        _LOGGER.debug("Fetching produced electicity from url, %s", url)
-        response = httpx.get(url, headers=self._headers)
-        data = {}
-        if response.status_code == httpx.codes.ok:
-            data = response.json()
-            _LOGGER.debug(
-                "Fetched data for produced electricity endpoint, %s", data["data"]
-            )
-            return data["data"]
-        else:
-            _LOGGER.error(
-                "Failed to fetch produced electricity data, %s", response.text
-            )
-            return data
+        return url
 
-    def check_auth(self):
+    async def check_auth(self):
         """Check to see if our jwt is valid."""
-        result = httpx.get(self._url_check_auth, headers=self._headers)
-        if result.status_code == httpx.codes.ok:
-            _LOGGER.debug("jwt is valid!")
+        if self.token_valid:
             return True
-        elif self.login() == False:
+        jwt = self._jwt
+        if jwt != "" and self._jwt_expires_at is None:
+            # Without a known expiry we have to ask the server
+            result = await self._auth_request("GET", self._url_check_auth)
+            if result.status_code == httpx.codes.ok:
+                _LOGGER.debug("jwt is valid!")
+                return True
             _LOGGER.debug(result.text)
-            return False
-        return True
+        elif jwt != "":
+            _LOGGER.debug("jwt is about to expire, refreshing it")
+        return await self._relogin(jwt)
 
-    def login(self):
+    async def login(self):
         """Login to the Greenely API."""
         result = False
         loginInfo = {"email": self._email, "password": self._password}
-        loginResult = httpx.post(
-            self._url_login, headers=self._headers, data=json.dumps(loginInfo)
+        loginResult = await self._auth_request(
+            "POST", self._url_login, json.dumps(loginInfo)
         )
+        self.metrics.record_login()
         if loginResult.status_code == httpx.codes.ok:
             jsonResult = loginResult.json()
             self._jwt = "JWT " + jsonResult["jwt"]
+            self._jwt_expires_at = decode_jwt_expiry(jsonResult["jwt"])
             self._headers["Authorization"] = self._jwt
             _LOGGER.debug("Successfully logged in and updated jwt")
-            if self._facility_id == "primary":
-                self.get_facility_id()
-            else:
-                _LOGGER.debug("Facility id is %s", self._facility_id)
             result = True
+            if self.on_login is not None:
+                self.on_login()
         else:
             _LOGGER.error(loginResult.text)
         return result
@@ -0,0 +1,144 @@
+"""Response cache of the Greenely API."""
+
+from __future__ import annotations
+
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import date
+import time
+
+import httpx
+
+# Most responses that are kept at a time, the least recently used go first
+MAX_ENTRIES = 64
+
+# Seconds a response stays fresh, per endpoint
+FACILITIES_TTL = 6 * 3600
+CURRENCY_TTL = 5 * 60
+RECENT_TTL = 5 * 60
+
+# Consumption and production of the last days may still be revised
+REVISION_DAYS = 2
+
+
+@dataclass
+class CachedResponse:
+    """A parsed response and what is needed to revalidate it."""
+
+    data: dict
+    expires_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
+
+def endpoint(url: str) -> str:
+    """Return the endpoint name of a Greenely url."""
+    return httpx.URL(url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def freshness(url: str, today: date) -> float:
+    """Return how many seconds a response of url stays fresh."""
+    name = endpoint(url)
+    params = httpx.URL(url).params
+    if name == "facilities":
+        return FACILITIES_TTL
+    if name == "checkauth" or "to" not in params:
+        return 0
+    # get_usage does not zero pad the day, so fromisoformat is not used here
+    year, month, day = (int(part) for part in params["to"].split("-"))
+    end = date(year, month, day)
+    if params.get("unit") == "currency":
+        return CURRENCY_TTL
+    if (today - end).days >= REVISION_DAYS:
+        # Ranges of closed days come from backfills and exports, which fetch
+        # each of them once, and keeping them would hold the whole range
+        return 0
+    return RECENT_TTL
+
+
+class ResponseCache:
+    """Parsed responses by url, with a freshness policy per endpoint."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES) -> None:
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._max_entries = max_entries
+        self.hits: Counter[str] = Counter()
+        self.revalidations: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+
+    def get(self, url: str) -> CachedResponse | None:
+        """Return the cached response of a url, fresh or not."""
+        cached = self._entries.get(url)
+        if cached is not None:
+            self._entries.move_to_end(url)
+        return cached
+
+    def fresh(self, url: str) -> dict | None:
+        """Return the cached data of a url if it is still fresh."""
+        cached = self.get(url)
+        if cached is not None and time.monotonic() < cached.expires_at:
+            self.hits[endpoint(url)] += 1
+            return cached.data
+        return None
+
+    def validators(self, url: str) -> dict[str, str]:
+        """Return the headers that revalidate a stale cached response."""
+        cached = self.get(url)
+        headers = {}
+        if cached is not None and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached is not None and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return headers
+
+    def revalidated(self, url: str) -> dict | None:
+        """Mark a stale cached response as fresh again and return its data."""
+        cached = self._entries.get(url)
+        if cached is None:
+            return None
+        cached.expires_at = time.monotonic() + freshness(url, date.today())
+        self.revalidations[endpoint(url)] += 1
+        return cached.data
+
+    def store(self, url: str, response: httpx.Response, data: dict) -> None:
+        """Cache a fetched response, if its endpoint is cacheable."""
+        self.misses[endpoint(url)] += 1
+        ttl = freshness(url, date.today())
+        if ttl <= 0:
+            return
+        self._entries[url] = CachedResponse(
+            data,
+            time.monotonic() + ttl,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+        self._entries.move_to_end(url)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def hit_rate(self, name: str | None = None) -> float | None:
+        """Return the percentage of lookups of an endpoint, or all, that hit."""
+        if name is None:
+            hits = sum(self.hits.values()) + sum(self.revalidations.values())
+            misses = sum(self.misses.values())
+        else:
+            hits = self.hits[name] + self.revalidations[name]
+            misses = self.misses[name]
+        total = hits + misses
+        return round(100 * hits / total, 1) if total else None
+
+    def clear(self) -> None:
+        """Drop all cached responses."""
+        self._entries.clear()
+
+    def stats(self) -> dict[str, dict]:
+        """Return the hits, revalidations, misses and hit rate per endpoint."""
+        stats = {}
+        for name in sorted(self.hits | self.revalidations | self.misses):
+            stats[name] = {
+                "hits": self.hits[name],
+                "revalidations": self.revalidations[name],
+                "misses": self.misses[name],
+                "hit_rate": self.hit_rate(name),
+            }
+        return stats
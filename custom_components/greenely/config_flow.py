@@ -5,6 +5,7 @@ from __future__ import annotations
 import logging
 from typing import Any
 
+import httpx
 import voluptuous as vol
 
 from homeassistant.config_entries import (
@@ -16,11 +17,13 @@ from homeassistant.config_entries import (
 from homeassistant.const import CONF_EMAIL, CONF_PASSWORD
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.httpx_client import get_async_client
 
 from .api import GreenelyApi
 
 from .const import (
     DOMAIN,
+    GREENELY_ALL_FACILITIES,
     GREENELY_DAILY_PRODUCED_ELECTRICITY,
     GREENELY_DAILY_USAGE,
     GREENELY_DATE_FORMAT,
@@ -28,10 +31,14 @@ from .const import (
     GREENELY_HOMEKIT_COMPATIBLE,
     GREENELY_HOURLY_OFFSET_DAYS,
     GREENELY_HOURLY_USAGE,
+    GREENELY_PRICE_WINDOWS,
     GREENELY_PRICES,
     GREENELY_PRODUCED_ELECTRICITY_DAYS,
+    GREENELY_SPOT_PRICE_RESOLUTION,
+    GREENELY_STATISTICS,
     GREENELY_TIME_FORMAT,
     GREENELY_USAGE_DAYS,
+    SPOT_PRICE_RESOLUTIONS,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -48,17 +55,17 @@ STEP_USER_DATA_SCHEMA = vol.Schema(
 class Greenelyhub:
     """Class to authenticate with the host."""
 
-    def __init__(self, email: str, password: str):
+    def __init__(self, hass: HomeAssistant, email: str, password: str):
         self.email = email
         self.password = password
-        self.api = GreenelyApi(self.email, self.password)
+        self.api = GreenelyApi(self.email, self.password, get_async_client(hass))
 
     async def authenticate(self) -> bool:
         """Test if we can authenticate with the host."""
-        return self.api.check_auth()
+        return await self.api.check_auth()
 
     async def get_facility_id(self) -> int:
-        return int(self.api.get_facility_id())
+        return int(await self.api.get_facility_id())
 
 
 async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str, Any]:
@@ -67,7 +74,7 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
     Data has the keys from STEP_USER_DATA_SCHEMA with values provided by the user.
     """
 
-    hub = Greenelyhub(data[CONF_EMAIL], data[CONF_PASSWORD])
+    hub = Greenelyhub(hass, data[CONF_EMAIL], data[CONF_PASSWORD])
 
     if not await hub.authenticate():
         raise InvalidAuth
@@ -104,6 +111,8 @@ class ConfigFlow(ConfigFlow, domain=DOMAIN):
                 info = await validate_input(self.hass, user_input)
             except InvalidAuth:
                 errors["base"] = "invalid_auth"
+            except httpx.HTTPError:
+                errors["base"] = "cannot_connect"
             except Exception:
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
@@ -194,12 +203,32 @@ class GreenelyOptionsFlow(OptionsFlow):
                     GREENELY_FACILITY_ID,
                     default=self.config_entry.options.get(GREENELY_FACILITY_ID),
                 ): int,
+                vol.Optional(
+                    GREENELY_ALL_FACILITIES,
+                    default=self.config_entry.options.get(
+                        GREENELY_ALL_FACILITIES, False
+                    ),
+                ): bool,
                 vol.Optional(
                     GREENELY_HOMEKIT_COMPATIBLE,
                     default=self.config_entry.options.get(
                         GREENELY_HOMEKIT_COMPATIBLE, False
                     ),
                 ): bool,
+                vol.Optional(
+                    GREENELY_STATISTICS,
+                    default=self.config_entry.options.get(GREENELY_STATISTICS, False),
+                ): bool,
+                vol.Optional(
+                    GREENELY_PRICE_WINDOWS,
+                    default=self.config_entry.options.get(GREENELY_PRICE_WINDOWS, "3"),
+                ): str,
+                vol.Optional(
+                    GREENELY_SPOT_PRICE_RESOLUTION,
+                    default=self.config_entry.options.get(
+                        GREENELY_SPOT_PRICE_RESOLUTION, "hourly"
+                    ),
+                ): vol.In(list(SPOT_PRICE_RESOLUTIONS)),
             }
         )
 
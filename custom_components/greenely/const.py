@@ -6,6 +6,7 @@ DOMAIN = "greenely"
 SENSOR_DAILY_USAGE_NAME = "Greenely Daily Usage"
 SENSOR_HOURLY_USAGE_NAME = "Greenely Hourly Usage"
 SENSOR_DAILY_PRODUCED_ELECTRICITY_NAME = "Greenely Daily Produced Electricity"
+SENSOR_HOURLY_PRODUCED_ELECTRICITY_NAME = "Greenely Hourly Produced Electricity"
 SENSOR_SOLD_NAME = "Greenely Sold"
 SENSOR_PRICES_NAME = "Greenely Prices"
 
@@ -19,7 +20,14 @@ GREENELY_DATE_FORMAT = "date_format"
 GREENELY_TIME_FORMAT = "time_format"
 GREENELY_HOURLY_OFFSET_DAYS = "hourly_offset_days"
 GREENELY_FACILITY_ID = "facility_id"
+GREENELY_ALL_FACILITIES = "all_facilities"
 GREENELY_HOMEKIT_COMPATIBLE = "homekit_compatible"
+GREENELY_STATISTICS = "statistics"
+GREENELY_PRICE_WINDOWS = "price_windows"
+GREENELY_SPOT_PRICE_RESOLUTION = "spot_price_resolution"
+
+# Spot price resolutions of the API, and their steps in seconds
+SPOT_PRICE_RESOLUTIONS = {"hourly": 3600, "quarter_hourly": 900}
 
 
 GREENELY_SOLD = "sold"
@@ -0,0 +1,402 @@
+"""Data update coordinator for the Greenely integration."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import aclosing
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta
+import logging
+import random
+
+import httpx
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_time_change
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .api import GreenelyApi
+from .const import (
+    DOMAIN,
+    GREENELY_DAILY_PRODUCED_ELECTRICITY,
+    GREENELY_DAILY_USAGE,
+    GREENELY_HOURLY_OFFSET_DAYS,
+    GREENELY_HOURLY_USAGE,
+    GREENELY_PRICES,
+    GREENELY_PRODUCED_ELECTRICITY_DAYS,
+    GREENELY_SPOT_PRICE_RESOLUTION,
+    GREENELY_STATISTICS,
+    GREENELY_USAGE_DAYS,
+    SENSOR_DAILY_PRODUCED_ELECTRICITY_NAME,
+    SENSOR_DAILY_USAGE_NAME,
+    SENSOR_HOURLY_PRODUCED_ELECTRICITY_NAME,
+    SENSOR_HOURLY_USAGE_NAME,
+    SENSOR_PRICES_NAME,
+    SPOT_PRICE_RESOLUTIONS,
+)
+from .metrics import SensorMetrics
+from .scheduler import FETCH_JITTER, TICK_MINUTES, FetchSchedule
+from .statistics import StatisticsImporter
+from .store import HOUR_SECONDS, GreenelyStore, SpotPriceCache
+
+# Tomorrow's spot prices are not published before this hour
+SPOT_PRICE_PUBLICATION_HOUR = 13
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class GreenelyCoordinatorData:
+    """Data fetched for one facility in a single update cycle."""
+
+    daily_usage: dict = field(default_factory=dict)
+    hourly_usage: dict = field(default_factory=dict)
+    produced_electricity: dict = field(default_factory=dict)
+    price_data: dict = field(default_factory=dict)
+    spot_price: dict = field(default_factory=dict)
+
+
+class GreenelyDataUpdateCoordinator(DataUpdateCoordinator[GreenelyCoordinatorData]):
+    """Fetch the data for all enabled sensors of one facility.
+
+    There is no fixed update interval. Shortly after every quarter of an
+    hour the data types that have been published since they were last
+    fetched are refreshed, and the listeners are only updated if that
+    changed the data.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        entry: ConfigEntry,
+        api: GreenelyApi,
+        store: GreenelyStore,
+        facility_id: str,
+    ) -> None:
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_{facility_id}",
+            always_update=False,
+        )
+        self.api = api
+        self.store = store
+        self.facility_id = facility_id
+
+        self.daily_usage = entry.data.get(GREENELY_DAILY_USAGE, True)
+        self.prices = entry.data.get(GREENELY_PRICES, True)
+        self.hourly_usage = entry.options.get(GREENELY_HOURLY_USAGE, False)
+        self.produced_electricity = entry.options.get(
+            GREENELY_DAILY_PRODUCED_ELECTRICITY, False
+        )
+        self.usage_days = entry.options.get(GREENELY_USAGE_DAYS, 10)
+        self.produced_electricity_days = entry.options.get(
+            GREENELY_PRODUCED_ELECTRICITY_DAYS, 10
+        )
+        self.hourly_offset_days = entry.options.get(GREENELY_HOURLY_OFFSET_DAYS, 1)
+        self.statistics = entry.options.get(GREENELY_STATISTICS, False)
+        self.spot_price_resolution = entry.options.get(
+            GREENELY_SPOT_PRICE_RESOLUTION, "hourly"
+        )
+        self.spot_price_step = SPOT_PRICE_RESOLUTIONS[self.spot_price_resolution]
+        self._importer = StatisticsImporter(hass, store, facility_id)
+        self._backfilling = False
+        self._schedule = FetchSchedule()
+        self.sensor_metrics: dict[str, SensorMetrics] = {}
+        # Each facility fetches at its own offset after the ticks, so that
+        # facilities and installations do not all poll at the same moment
+        self._fetch_offset = random.randrange(FETCH_JITTER)
+
+    @callback
+    def async_start_schedule(self) -> CALLBACK_TYPE:
+        """Start the scheduled fetches, and return how to stop them."""
+        minutes, seconds = divmod(self._fetch_offset, 60)
+        return async_track_time_change(
+            self.hass,
+            self._async_scheduled_refresh,
+            minute=[(minute + minutes) % 60 for minute in TICK_MINUTES],
+            second=seconds,
+        )
+
+    async def _async_scheduled_refresh(self, now: datetime) -> None:
+        await self.async_refresh()
+
+    @callback
+    def async_restore(self) -> None:
+        """Show the data kept in the store until the first refresh is done."""
+        if not self.store.has_facility(self.facility_id):
+            return
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        data = GreenelyCoordinatorData()
+        for name, value_key, start, _ in self._series(today):
+            series = self.store.series(self.facility_id, name, value_key)
+            setattr(data, name, series.window(start))
+        if self.prices:
+            data.price_data = self.store.month_cost(self.facility_id).response(
+                today.date()
+            )
+            data.spot_price = self._spot_prices().response(_spot_price_days(today))
+        self.async_set_updated_data(data)
+
+    def _series(self, today: datetime) -> list[tuple]:
+        """Return the name, value key, start and request of each enabled series."""
+        series = []
+        if self.daily_usage:
+            series.append(
+                (
+                    "daily_usage",
+                    "usage",
+                    today - timedelta(days=self.usage_days),
+                    lambda start: self.api.get_usage(
+                        self.facility_id, start, today, False
+                    ),
+                )
+            )
+        if self.hourly_usage:
+            series.append(
+                (
+                    "hourly_usage",
+                    "usage",
+                    today - timedelta(days=self.hourly_offset_days),
+                    lambda start: self.api.get_usage(
+                        self.facility_id, start, today, True
+                    ),
+                )
+            )
+        if self.produced_electricity:
+            series.append(
+                (
+                    "produced_electricity",
+                    "value",
+                    today - timedelta(days=(self.produced_electricity_days - 1)),
+                    lambda start: self.api.get_produced_electricity(
+                        self.facility_id, start, today + timedelta(days=1), False
+                    ),
+                )
+            )
+        return series
+
+    async def _async_update_data(self) -> GreenelyCoordinatorData:
+        """Check authentication once, then fetch everything the sensors need."""
+        _LOGGER.debug("Checking jwt validity...")
+        try:
+            logged_in = await self.api.check_auth()
+        except httpx.HTTPError as err:
+            raise UpdateFailed(f"Unable to reach Greenely: {err}") from err
+        if not logged_in:
+            raise UpdateFailed("Unable to log in!")
+
+        now = datetime.now()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        # Data types that are not due keep what was fetched last time
+        data = (
+            replace(self.data) if self.data is not None else GreenelyCoordinatorData()
+        )
+        due = self._schedule.due(now)
+        _LOGGER.debug("Fetching %s for %s", sorted(due), self.facility_id)
+        fetches = [
+            self._async_fetch_series(data, name, value_key, start, request)
+            for name, value_key, start, request in self._series(today)
+            if name in due
+        ]
+        if self.prices and "price_data" in due:
+            fetches.append(self._async_fetch_month_cost(data, today))
+        if self.prices:
+            fetches.append(self._async_fetch_spot_prices(data, today))
+
+        await asyncio.gather(*fetches)
+        self._schedule.fetched(due, now)
+        _LOGGER.debug("Response cache: %s", self.api.cache.stats())
+        self.store.async_schedule_save()
+        if self.statistics and not self._backfilling:
+            self._async_import_statistics(data)
+        return data
+
+    def _async_import_statistics(self, data: GreenelyCoordinatorData) -> None:
+        """Append the newly fetched points to long-term statistics."""
+        if self.daily_usage:
+            self._importer.async_import_energy(
+                "daily_usage", SENSOR_DAILY_USAGE_NAME, data.daily_usage, "usage"
+            )
+        if self.hourly_usage:
+            self._importer.async_import_energy(
+                "hourly_usage", SENSOR_HOURLY_USAGE_NAME, data.hourly_usage, "usage"
+            )
+        if self.produced_electricity:
+            self._importer.async_import_energy(
+                "produced_electricity",
+                SENSOR_DAILY_PRODUCED_ELECTRICITY_NAME,
+                data.produced_electricity,
+                "value",
+            )
+        if self.prices:
+            # Statistics are hourly, whatever the resolution of the prices
+            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+            self._importer.async_import_prices(
+                "spot_price",
+                SENSOR_PRICES_NAME,
+                self._spot_prices().response(_spot_price_days(today), HOUR_SECONDS),
+            )
+
+    async def async_backfill(self, start: date, end: date) -> None:
+        """Import hourly usage and produced electricity between two dates.
+
+        The range is streamed and imported a month at a time. The running
+        sums continue from the statistics before the range, and the range is
+        extended up to the last imported point, so that they stay continuous.
+        Raises HomeAssistantError if any part of the range cannot be fetched.
+        """
+        if self._backfilling:
+            _LOGGER.warning("A backfill of %s is already running", self.facility_id)
+            return
+        try:
+            logged_in = await self.api.check_auth()
+        except httpx.HTTPError as err:
+            raise HomeAssistantError(f"Unable to reach Greenely: {err}") from err
+        if not logged_in:
+            raise HomeAssistantError("Unable to log in")
+
+        series = {
+            "hourly_usage": (
+                SENSOR_HOURLY_USAGE_NAME,
+                "usage",
+                self.api.stream_usage,
+            ),
+            "hourly_produced_electricity": (
+                SENSOR_HOURLY_PRODUCED_ELECTRICITY_NAME,
+                "value",
+                self.api.stream_produced_electricity,
+            ),
+        }
+        for state in map(self._importer.state, series):
+            if state["last"] is not None:
+                end = max(end, date.fromisoformat(state["last"][:10]))
+        range_start = datetime.combine(start, datetime.min.time())
+        range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+        self._backfilling = True
+        try:
+            for name, (title, value_key, stream) in series.items():
+                _LOGGER.debug("Backfilling %s from %s to %s", name, start, end)
+                state = {
+                    "last": None,
+                    "sum": await self._importer.async_sum_before(name, range_start),
+                }
+                month = {}
+                async with aclosing(
+                    stream(self.facility_id, range_start, range_end, True)
+                ) as points:
+                    async for localtime, value in points:
+                        if month and localtime[:7] not in month:
+                            self._async_import_month(
+                                name, title, value_key, state, month
+                            )
+                            month = {}
+                        # Points of a month are imported together, once the
+                        # first point of the next month arrives
+                        month.setdefault(localtime[:7], {})[localtime] = {
+                            "localtime": localtime,
+                            value_key: value,
+                        }
+                self._async_import_month(name, title, value_key, state, month)
+                self._importer.state(name).update(state)
+        except (httpx.HTTPError, ValueError) as err:
+            raise HomeAssistantError(
+                f"Backfill of {self.facility_id} failed: {err}"
+            ) from err
+        finally:
+            self._backfilling = False
+        self.store.async_schedule_save()
+
+    def _async_import_month(self, name, title, value_key, state, month):
+        self._importer.async_import_energy(
+            name,
+            title,
+            dict(
+                sorted(point for points in month.values() for point in points.items())
+            ),
+            value_key,
+            state,
+            skip_missing=True,
+        )
+
+    async def _async_fetch_series(
+        self,
+        data: GreenelyCoordinatorData,
+        name: str,
+        value_key: str,
+        start: datetime,
+        request,
+    ):
+        """Fetch only the part of a series that the store is missing.
+
+        The windows of the sensors are bounded, so their responses are parsed
+        whole, which is faster than streaming them. Only the backfill and the
+        export, whose ranges are not bounded, stream their responses.
+        """
+        series = self.store.series(self.facility_id, name, value_key)
+        fetch_start = series.fetch_start(start)
+        _LOGGER.debug("Fetching %s since %s", name, fetch_start)
+        try:
+            response = await request(fetch_start)
+        except httpx.HTTPError as err:
+            raise UpdateFailed(f"Error fetching {name}: {err}") from err
+        for point in response.values():
+            series.add(point["localtime"], point[value_key])
+        if response:
+            series.commit(start, fetch_start)
+        setattr(data, name, series.window(start))
+
+    async def _async_fetch_spot_prices(
+        self, data: GreenelyCoordinatorData, today: datetime
+    ):
+        """Fetch only the days of spot prices that are not final yet."""
+        prices = self._spot_prices()
+        days = _spot_price_days(today)
+        prices.prune(days[0])
+        missing = prices.missing_days(days)
+        if (
+            days[2] in missing
+            and datetime.now().hour < SPOT_PRICE_PUBLICATION_HOUR
+            and len(missing) == 1
+        ):
+            _LOGGER.debug("Tomorrow's spot prices are not published yet")
+            missing = []
+        if missing:
+            _LOGGER.debug("Fetching spot prices for %s", missing)
+            try:
+                response = await self.api.get_spot_price(
+                    self.facility_id,
+                    missing[0],
+                    missing[-1] + timedelta(days=1),
+                    self.spot_price_resolution,
+                )
+            except httpx.HTTPError as err:
+                raise UpdateFailed(f"Error fetching spot_price: {err}") from err
+            if response:
+                prices.merge(response, missing)
+        data.spot_price = prices.response(days)
+
+    def _spot_prices(self) -> SpotPriceCache:
+        return self.store.spot_prices(self.facility_id, self.spot_price_step)
+
+    async def _async_fetch_month_cost(
+        self, data: GreenelyCoordinatorData, today: datetime
+    ):
+        """Fetch the costs of the days of this month that may still change."""
+        month_cost = self.store.month_cost(self.facility_id)
+        start = month_cost.fetch_start(today.date())
+        _LOGGER.debug("Fetching the costs of this month since %s", start)
+        try:
+            response = await self.api.get_price_data(self.facility_id, start)
+        except httpx.HTTPError as err:
+            raise UpdateFailed(f"Error fetching price_data: {err}") from err
+        month_cost.merge(response or {})
+        data.price_data = month_cost.response(today.date())
+
+
+def _spot_price_days(today: datetime) -> list[date]:
+    """Return the days of spot prices that are shown: yesterday to tomorrow."""
+    return [(today + timedelta(days=offset)).date() for offset in (-1, 0, 1)]
@@ -0,0 +1,38 @@
+"""Diagnostics support for the Greenely integration."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_EMAIL, CONF_PASSWORD
+from homeassistant.core import HomeAssistant
+
+from . import GreenelyConfigEntry
+
+TO_REDACT = {CONF_EMAIL, CONF_PASSWORD, "jwt"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: GreenelyConfigEntry
+) -> dict[str, Any]:
+    """Return the metrics of the API session and sensors of a config entry."""
+    data = entry.runtime_data
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "api": {
+            **data.api.metrics.as_dict(),
+            "token_valid": data.api.token_valid,
+            "cache": data.api.cache.stats(),
+        },
+        "facilities": {
+            facility_id: {
+                "last_update_success": coordinator.last_update_success,
+                "sensors": {
+                    unique_id: metrics.as_dict()
+                    for unique_id, metrics in coordinator.sensor_metrics.items()
+                },
+            }
+            for facility_id, coordinator in data.coordinators.items()
+        },
+    }
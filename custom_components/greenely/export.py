@@ -0,0 +1,151 @@
+"""Export of the history of the Greenely integration to files."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import aclosing
+import csv
+from datetime import datetime
+import importlib.util
+import logging
+import os
+
+from homeassistant.core import HomeAssistant
+
+from .api import HOURLY_CHUNK_DAYS, split_range
+from .coordinator import GreenelyDataUpdateCoordinator
+
+_LOGGER = logging.getLogger(__name__)
+
+COLUMNS = ("facility_id", "localtime", "usage", "produced_electricity", "spot_price")
+
+FORMAT_CSV = "csv"
+FORMAT_PARQUET = "parquet"
+
+
+def parquet_available() -> bool:
+    """Return True if pyarrow is installed, so Parquet can be written."""
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class _CsvWriter:
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, rows: list[tuple]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ParquetWriter:
+    def __init__(self, path: str) -> None:
+        # pyarrow is optional, and only imported when Parquet is written
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._schema = pa.schema(
+            [
+                ("facility_id", pa.string()),
+                ("localtime", pa.string()),
+                ("usage", pa.float64()),
+                ("produced_electricity", pa.float64()),
+                ("spot_price", pa.float64()),
+            ]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: list[tuple]) -> None:
+        # Each chunk becomes a row group, so only one chunk is in memory
+        columns = list(zip(*rows)) if rows else [[] for _ in COLUMNS]
+        self._writer.write_table(
+            self._pa.Table.from_arrays(
+                [list(column) for column in columns], schema=self._schema
+            )
+        )
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+def _open_writer(path: str, file_format: str) -> _CsvWriter | _ParquetWriter:
+    if file_format == FORMAT_PARQUET:
+        return _ParquetWriter(path)
+    return _CsvWriter(path)
+
+
+async def async_export(
+    hass: HomeAssistant,
+    coordinators: list[GreenelyDataUpdateCoordinator],
+    start: datetime,
+    end: datetime,
+    path: str,
+    file_format: str,
+) -> int:
+    """Write the hourly history of facilities to a file, returning the rows.
+
+    The range is fetched a chunk at a time, and each chunk is written as soon
+    as it has arrived while the next one is fetched. The file is written
+    next to path and only moved there once it is complete.
+    """
+    partial = path + ".part"
+    writer = await hass.async_add_executor_job(_open_writer, partial, file_format)
+    rows = 0
+    try:
+        for coordinator in coordinators:
+            chunks = split_range(start, end, HOURLY_CHUNK_DAYS)
+            fetch = asyncio.ensure_future(_async_fetch_chunk(coordinator, *chunks[0]))
+            try:
+                for index in range(len(chunks)):
+                    chunk = await fetch
+                    if index + 1 < len(chunks):
+                        fetch = asyncio.ensure_future(
+                            _async_fetch_chunk(coordinator, *chunks[index + 1])
+                        )
+                    await hass.async_add_executor_job(writer.write, chunk)
+                    rows += len(chunk)
+            finally:
+                fetch.cancel()
+    except BaseException:
+        await hass.async_add_executor_job(_discard, writer, partial)
+        raise
+    await hass.async_add_executor_job(writer.close)
+    await hass.async_add_executor_job(os.replace, partial, path)
+    return rows
+
+
+def _discard(writer: _CsvWriter | _ParquetWriter, partial: str) -> None:
+    writer.close()
+    os.remove(partial)
+
+
+async def _async_fetch_chunk(
+    coordinator: GreenelyDataUpdateCoordinator, start: datetime, end: datetime
+) -> list[tuple]:
+    """Fetch the hourly usage, produced electricity and prices of a chunk."""
+    api = coordinator.api
+    facility_id = coordinator.facility_id
+    _LOGGER.debug("Exporting %s from %s to %s", facility_id, start, end)
+
+    async def collect(stream) -> list[tuple]:
+        # Closing the stream when the export is cancelled or fails releases
+        # its response, and with it the pooled connection
+        async with aclosing(stream) as points:
+            return [point async for point in points]
+
+    columns = await asyncio.gather(
+        collect(api.stream_usage(facility_id, start, end, True)),
+        collect(api.stream_produced_electricity(facility_id, start, end, True)),
+        collect(api.stream_spot_price(facility_id, start, end)),
+    )
+    hours: dict[str, list] = {}
+    for column, (points, scale) in enumerate(zip(columns, (1000, 1000, 100000))):
+        for localtime, value in points:
+            hour = hours.setdefault(localtime, [None, None, None])
+            if value is not None:
+                hour[column] = value / scale
+    return [(facility_id, localtime, *hours[localtime]) for localtime in sorted(hours)]
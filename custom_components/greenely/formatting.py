@@ -0,0 +1,42 @@
+"""Cached parsing and formatting of Greenely times."""
+
+from __future__ import annotations
+
+from datetime import datetime
+from functools import lru_cache
+
+from .prices import parse_localtime
+
+CACHE_SIZE = 8192
+
+
+class LocaltimeFormatter:
+    """Format times with the configured formats, remembering recent results.
+
+    One formatter is shared by all sensors of a config entry, so a localtime
+    that is seen by several sensors or on every update is only parsed and
+    formatted once.
+    """
+
+    def __init__(self, date_format: str, time_format: str) -> None:
+        self.date_format = date_format
+        self.time_format = time_format
+        self.localtime = lru_cache(maxsize=CACHE_SIZE)(self._format_localtime)
+        self.timestamp = lru_cache(maxsize=CACHE_SIZE)(self._format_timestamp)
+
+    def _format_localtime(self, localtime: str) -> tuple[datetime, str, str]:
+        """Return a localtime parsed, and formatted as date and time."""
+        dt_object = parse_localtime(localtime)
+        return (
+            dt_object,
+            dt_object.strftime(self.date_format),
+            dt_object.strftime(self.time_format),
+        )
+
+    def _format_timestamp(self, timestamp: float) -> tuple[str, str]:
+        """Return a timestamp formatted as date and time."""
+        dt_object = datetime.fromtimestamp(timestamp)
+        return (
+            dt_object.strftime(self.date_format),
+            dt_object.strftime(self.time_format),
+        )
@@ -0,0 +1,157 @@
+"""Performance metrics of the Greenely integration."""
+
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Callable, Mapping
+import json
+import time
+
+# Most recent latencies kept per endpoint for the percentiles
+LATENCY_SAMPLES = 256
+
+
+def percentile(values: list[float], fraction: float) -> float | None:
+    """Return a percentile of values by the nearest rank."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class EndpointMetrics:
+    """Requests, errors, retries, latencies and sizes of one endpoint."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.max_bytes = 0
+        self.latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def as_dict(self) -> dict:
+        """Return the metrics, with latencies in milliseconds."""
+        latencies = list(self.latencies)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            **{
+                name: None if value is None else round(value * 1000, 1)
+                for name, value in (
+                    ("latency_p50_ms", percentile(latencies, 0.5)),
+                    ("latency_p90_ms", percentile(latencies, 0.9)),
+                    ("latency_p99_ms", percentile(latencies, 0.99)),
+                )
+            },
+        }
+
+
+class ApiMetrics:
+    """Metrics of the requests and logins of one GreenelyApi."""
+
+    def __init__(self) -> None:
+        self.endpoints: dict[str, EndpointMetrics] = {}
+        self.logins = 0
+        self.last_login: float | None = None
+        self.started = time.time()
+
+    def endpoint(self, name: str) -> EndpointMetrics:
+        """Return the metrics of an endpoint."""
+        return self.endpoints.setdefault(name, EndpointMetrics())
+
+    def record_request(self, name: str, seconds: float, size: int, ok: bool) -> None:
+        """Record a finished request."""
+        metrics = self.endpoint(name)
+        metrics.requests += 1
+        metrics.latencies.append(seconds)
+        metrics.bytes += size
+        metrics.max_bytes = max(metrics.max_bytes, size)
+        if not ok:
+            metrics.errors += 1
+
+    def record_bytes(self, name: str, size: int) -> None:
+        """Record the size of a response that was streamed."""
+        metrics = self.endpoint(name)
+        metrics.bytes += size
+        metrics.max_bytes = max(metrics.max_bytes, size)
+
+    def record_error(self, name: str) -> None:
+        """Record a request that failed without a response."""
+        metrics = self.endpoint(name)
+        metrics.requests += 1
+        metrics.errors += 1
+
+    def record_retry(self, name: str) -> None:
+        """Record that a request of an endpoint is retried."""
+        self.endpoint(name).retries += 1
+
+    def record_login(self) -> None:
+        """Record a login."""
+        self.logins += 1
+        self.last_login = time.time()
+
+    @property
+    def total_requests(self) -> int:
+        """Return the number of requests to all endpoints."""
+        return sum(metrics.requests for metrics in self.endpoints.values())
+
+    def latency_p90(self) -> float | None:
+        """Return the 90th percentile latency over all endpoints, in seconds."""
+        return percentile(
+            [s for metrics in self.endpoints.values() for s in metrics.latencies],
+            0.9,
+        )
+
+    def as_dict(self) -> dict:
+        """Return all metrics."""
+        hours = max((time.time() - self.started) / 3600, 1)
+        return {
+            "endpoints": {
+                name: metrics.as_dict()
+                for name, metrics in sorted(self.endpoints.items())
+            },
+            "logins": self.logins,
+            "logins_per_hour": round(self.logins / hours, 2),
+            "last_login": self.last_login,
+        }
+
+
+class SensorMetrics:
+    """Update times and attribute sizes of one sensor."""
+
+    def __init__(self, attributes: Callable[[], Mapping | None]) -> None:
+        # The attributes are only serialized when the metrics are read
+        self._attributes = attributes
+        self.updates = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record_update(self, seconds: float) -> None:
+        """Record an update of the sensor from new data."""
+        self.updates += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def attributes_bytes(self) -> int:
+        """Return the size of the current attributes serialized as JSON."""
+        return len(json.dumps(self._attributes(), default=str))
+
+    def as_dict(self) -> dict:
+        """Return the metrics, with times in milliseconds."""
+        return {
+            "updates": self.updates,
+            "last_ms": round(self.last_seconds * 1000, 2),
+            "mean_ms": (
+                round(self.total_seconds / self.updates * 1000, 2)
+                if self.updates
+                else None
+            ),
+            "max_ms": round(self.max_seconds * 1000, 2),
+            "attributes_bytes": self.attributes_bytes(),
+        }
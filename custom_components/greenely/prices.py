@@ -0,0 +1,117 @@
+"""Compact spot price series for the Greenely integration."""
+
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+
+def parse_localtime(localtime: str) -> datetime:
+    """Parse a Greenely "%Y-%m-%d %H:%M" localtime without strptime."""
+    return datetime(
+        int(localtime[0:4]),
+        int(localtime[5:7]),
+        int(localtime[8:10]),
+        int(localtime[11:13]),
+        int(localtime[14:16]),
+    )
+
+
+class PriceSeries:
+    """Spot prices as sorted arrays of start timestamps and prices."""
+
+    __slots__ = ("starts", "prices", "step")
+
+    def __init__(self, starts: array, prices: array, step: int = 3600) -> None:
+        self.starts = starts
+        self.prices = prices
+        self.step = step
+
+    @classmethod
+    def from_response(cls, response: dict, step: int = 3600) -> PriceSeries:
+        """Parse a spot price response once, skipping missing prices."""
+        points = sorted(
+            (parse_localtime(point["localtime"]).timestamp(), point["price"])
+            for point in response.get("data", {}).values()
+            if point["price"] is not None
+        )
+        return cls(
+            array("d", [start for start, _ in points]),
+            array("d", [price for _, price in points]),
+            step,
+        )
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def mean(self, indexes: range) -> float | None:
+        """Return the mean of the prices at indexes, like an hour of quarters."""
+        if not indexes:
+            return None
+        return sum(self.prices[i] for i in indexes) / len(indexes)
+
+    def between(self, start: float, end: float) -> range:
+        """Return the indexes of the prices that start in [start, end)."""
+        return range(bisect_left(self.starts, start), bisect_left(self.starts, end))
+
+    def index_at(self, timestamp: float) -> int | None:
+        """Return the index of the price that applies at timestamp."""
+        index = bisect_right(self.starts, timestamp) - 1
+        if index >= 0 and timestamp < self.starts[index] + self.step:
+            return index
+        return None
+
+    def windows(self, indexes: range, hours: int) -> tuple[int | None, int | None]:
+        """Return where the cheapest and most expensive windows of hours start.
+
+        A window is a run of consecutive prices, and the sums of all windows
+        are found in one pass by sliding the window over the prices.
+        """
+        length = round(hours * 3600 / self.step)
+        starts = self.starts
+        prices = self.prices
+        cheapest = most_expensive = None
+        low = high = total = 0.0
+        run = 0
+        for i in indexes:
+            if run and starts[i] - starts[i - 1] != self.step:
+                # A missing price ends the windows that contain it
+                run = 0
+                total = 0.0
+            total += prices[i]
+            run += 1
+            if run > length:
+                total -= prices[i - length]
+            if run >= length:
+                if cheapest is None or total < low:
+                    cheapest, low = i - length + 1, total
+                if most_expensive is None or total > high:
+                    most_expensive, high = i - length + 1, total
+        return cheapest, most_expensive
+
+    def ranks(self, indexes: range) -> list[int]:
+        """Return the rank of each price among indexes, 1 being the cheapest.
+
+        Equal prices share the same rank.
+        """
+        prices = self.prices
+        ranks = [0] * len(indexes)
+        rank = 0
+        previous = None
+        for position, i in enumerate(sorted(indexes, key=prices.__getitem__), 1):
+            if prices[i] != previous:
+                rank = position
+                previous = prices[i]
+            ranks[i - indexes.start] = rank
+        return ranks
+
+
+def parse_window_hours(value: str) -> list[int]:
+    """Parse a comma separated list of window lengths in hours."""
+    hours = set()
+    for part in value.split(","):
+        part = part.strip()
+        if part.isdigit() and 0 < int(part) <= 24:
+            hours.add(int(part))
+    return sorted(hours)
@@ -0,0 +1,100 @@
+"""Retries and circuit breaking for the Greenely API."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+import time
+
+import httpx
+
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+MAX_RETRY_DELAY = 30.0
+
+# Failed requests in a row, each after all its retries, after which the
+# circuit of a host opens
+FAILURE_THRESHOLD = 5
+# Seconds an open circuit waits before it lets a trial request through
+RESET_TIMEOUT = 300
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """Raised instead of sending a request to a host that keeps failing."""
+
+
+def is_transient(response: httpx.Response) -> bool:
+    """Return True if a response is worth retrying."""
+    return (
+        response.status_code == httpx.codes.TOO_MANY_REQUESTS
+        or response.status_code >= httpx.codes.INTERNAL_SERVER_ERROR
+    )
+
+
+def retry_after(response: httpx.Response) -> float | None:
+    """Return the seconds a Retry-After header asks to wait, if any."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int) -> float:
+    """Return a random delay before retry attempt, growing exponentially."""
+    return random.uniform(0, min(MAX_RETRY_DELAY, RETRY_BASE_DELAY * 2**attempt))
+
+
+class CircuitBreaker:
+    """Stop sending requests to a host after repeated failures.
+
+    Once open, the circuit rejects requests until RESET_TIMEOUT has passed.
+    Then a single trial request is let through, which closes the circuit if
+    it succeeds and keeps it open for another RESET_TIMEOUT if it fails.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        """Return True if requests are currently rejected."""
+        return (
+            self.opened_at is not None
+            and time.monotonic() < self.opened_at + self.reset_timeout
+        )
+
+    def check(self, host: str) -> None:
+        """Raise CircuitOpenError unless a request may be sent."""
+        if self.is_open:
+            raise CircuitOpenError(f"Circuit to {host} is open after failures")
+        if self.opened_at is not None:
+            # Let this request through as the trial, and reject the others
+            # until it has finished
+            self.opened_at = time.monotonic()
+
+    def record_success(self) -> None:
+        """Close the circuit."""
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        """Count a failure, opening the circuit at the threshold."""
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
@@ -0,0 +1,58 @@
+"""Fetch schedule of the Greenely data types."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# Minutes of the hour at which the price state ticks and fetches are checked
+TICK_MINUTES = (0, 15, 30, 45)
+
+# Seconds after a tick at which a facility checks its fetches, at most
+FETCH_JITTER = 5 * 60
+
+# How long after the end of its period Greenely publishes a data type
+HOURLY_PUBLICATION_DELAY = timedelta(minutes=30)
+DAILY_PUBLICATION_DELAY = timedelta(hours=6)
+
+# The period and publication delay of each data type. Spot prices are not
+# listed, the coordinator fetches them whenever a day of them is missing.
+# Produced electricity and the month's cost include today, which grows
+# during the day, so they are fetched hourly. Only their days that may
+# still be revised are fetched, the closed days are kept in the store.
+SCHEDULES = {
+    "daily_usage": (DAY, DAILY_PUBLICATION_DELAY),
+    "hourly_usage": (HOUR, HOURLY_PUBLICATION_DELAY),
+    "produced_electricity": (HOUR, HOURLY_PUBLICATION_DELAY),
+    "price_data": (HOUR, HOURLY_PUBLICATION_DELAY),
+}
+
+
+def last_publication(now: datetime, period: timedelta, delay: timedelta) -> datetime:
+    """Return when data of a period and delay was last published."""
+    moment = now - delay
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + (moment - midnight) // period * period + delay
+
+
+class FetchSchedule:
+    """Remember when each data type was fetched, and tell when it is due."""
+
+    def __init__(self) -> None:
+        self._fetched: dict[str, datetime] = {}
+
+    def due(self, now: datetime) -> set[str]:
+        """Return the data types that have been published since last fetched."""
+        return {
+            name
+            for name, (period, delay) in SCHEDULES.items()
+            if name not in self._fetched
+            or self._fetched[name] < last_publication(now, period, delay)
+        }
+
+    def fetched(self, names: set[str], now: datetime) -> None:
+        """Record that data types were fetched."""
+        for name in names:
+            self._fetched[name] = now
@@ -1,108 +1,168 @@
+from abc import abstractmethod
+from array import array
 from datetime import datetime, timedelta
 import logging
+import time
 
-from homeassistant.components.sensor import SensorDeviceClass
-from homeassistant.const import UnitOfEnergy
-from homeassistant.core import HomeAssistant
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity
+from homeassistant.const import EntityCategory, UnitOfEnergy
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.device_registry import DeviceInfo
-from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_track_time_change
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from . import GreenelyData
+from . import GreenelyConfigEntry
 from .const import (
     DOMAIN,
-    GREENELY_DAILY_PRODUCED_ELECTRICITY,
-    GREENELY_DAILY_USAGE,
-    GREENELY_DATE_FORMAT,
     GREENELY_HOMEKIT_COMPATIBLE,
-    GREENELY_HOURLY_OFFSET_DAYS,
-    GREENELY_HOURLY_USAGE,
-    GREENELY_PRICES,
-    GREENELY_PRODUCED_ELECTRICITY_DAYS,
-    GREENELY_TIME_FORMAT,
-    GREENELY_USAGE_DAYS,
-    GREENELY_FACILITY_ID,
+    GREENELY_PRICE_WINDOWS,
     SENSOR_DAILY_PRODUCED_ELECTRICITY_NAME,
     SENSOR_DAILY_USAGE_NAME,
     SENSOR_HOURLY_USAGE_NAME,
     SENSOR_PRICES_NAME,
 )
-
-SCAN_INTERVAL = timedelta(minutes=10)
+from .coordinator import GreenelyDataUpdateCoordinator
+from .metrics import SensorMetrics
+from .prices import PriceSeries, parse_window_hours
+from .scheduler import TICK_MINUTES
+from .statistics import statistic_id
 
 _LOGGER = logging.getLogger(__name__)
 
+# Only the diagnostic sensors poll, the others follow their coordinator
+SCAN_INTERVAL = timedelta(minutes=5)
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
-    config_entry: GreenelyData,
+    config_entry: GreenelyConfigEntry,
     async_add_entities,
 ):
     """Setup sensors from a config entry created in the integrations UI."""
-    api = config_entry.runtime_data.api
-    facility_id = str(config_entry.options.get(GREENELY_FACILITY_ID))
-    usage_days = config_entry.options.get(GREENELY_USAGE_DAYS, 10)
-    production_days = config_entry.options.get(GREENELY_PRODUCED_ELECTRICITY_DAYS, 10)
-    hourly_offset_days = config_entry.options.get(GREENELY_HOURLY_OFFSET_DAYS, 1)
-    date_format = config_entry.options.get(GREENELY_DATE_FORMAT, "%b %d %Y")
-    time_format = config_entry.options.get(GREENELY_TIME_FORMAT, "%H:%M")
+    formatter = config_entry.runtime_data.formatter
     homekit_compatible = config_entry.options.get(GREENELY_HOMEKIT_COMPATIBLE, False)
+    window_hours = parse_window_hours(
+        config_entry.options.get(GREENELY_PRICE_WINDOWS, "3")
+    )
 
     sensors = []
 
-    api.set_facility_id(facility_id)
-
-    if config_entry.data.get(GREENELY_DAILY_USAGE, True):
-        sensors.append(
-            GreenelyDailyUsageSensor(
-                SENSOR_DAILY_USAGE_NAME,
-                api,
-                facility_id,
-                usage_days,
-                date_format,
-                time_format,
+    for index, (facility_id, coordinator) in enumerate(
+        config_entry.runtime_data.coordinators.items()
+    ):
+        # The configured facility keeps the plain sensor names
+        suffix = "" if index == 0 else f" {facility_id}"
+
+        if coordinator.daily_usage:
+            sensors.append(
+                GreenelyDailyUsageSensor(
+                    SENSOR_DAILY_USAGE_NAME + suffix,
+                    coordinator,
+                    facility_id,
+                    formatter,
+                )
             )
-        )
-    if config_entry.data.get(GREENELY_PRICES, True):
-        sensors.append(
-            GreenelyPricesSensor(
-                SENSOR_PRICES_NAME,
-                api,
-                facility_id,
-                date_format,
-                time_format,
-                homekit_compatible,
+        if coordinator.prices:
+            sensors.append(
+                GreenelyPricesSensor(
+                    SENSOR_PRICES_NAME + suffix,
+                    coordinator,
+                    facility_id,
+                    formatter,
+                    homekit_compatible,
+                    window_hours,
+                )
             )
-        )
 
-    if config_entry.options.get(GREENELY_HOURLY_USAGE, False):
-        sensors.append(
-            GreenelyHourlyUsageSensor(
-                SENSOR_HOURLY_USAGE_NAME,
-                api,
-                facility_id,
-                hourly_offset_days,
-                date_format,
-                time_format,
+        if coordinator.hourly_usage:
+            sensors.append(
+                GreenelyHourlyUsageSensor(
+                    SENSOR_HOURLY_USAGE_NAME + suffix,
+                    coordinator,
+                    facility_id,
+                    formatter,
+                )
             )
-        )
 
-    if config_entry.options.get(GREENELY_DAILY_PRODUCED_ELECTRICITY, False):
-        sensors.append(
-            GreenelyDailyProducedElecticitySensor(
-                SENSOR_DAILY_PRODUCED_ELECTRICITY_NAME,
-                api,
-                facility_id,
-                production_days,
-                date_format,
-                time_format,
+        if coordinator.produced_electricity:
+            sensors.append(
+                GreenelyDailyProducedElecticitySensor(
+                    SENSOR_DAILY_PRODUCED_ELECTRICITY_NAME + suffix,
+                    coordinator,
+                    facility_id,
+                    formatter,
+                )
             )
-        )
 
-    async_add_entities(sensors, True)
+    api = config_entry.runtime_data.api
+    # The api is shared, so its metrics belong to the first facility
+    facility_id = next(iter(config_entry.runtime_data.coordinators))
+    for key in GreenelyApiDiagnosticSensor.KEYS:
+        sensors.append(GreenelyApiDiagnosticSensor(key, api, facility_id))
+
+    async_add_entities(sensors)
+
+
+class GreenelyCoordinatorEntity(CoordinatorEntity[GreenelyDataUpdateCoordinator]):
+    """Common coordinator handling of the Greenely sensors."""
+
+    _statistic_name = ""
+    # When the state also depends on the clock, the time pattern at which it
+    # is updated from the data it already has
+    _clock_pattern: dict | None = None
+    _metrics: SensorMetrics | None = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        if self._clock_pattern is not None:
+            self.async_on_remove(
+                async_track_time_change(
+                    self.hass, self._async_clock_changed, **self._clock_pattern
+                )
+            )
+
+    @callback
+    def _async_clock_changed(self, now) -> None:
+        """Update the state from the data in memory, without any I/O."""
+        self._update_measured()
+        self.async_write_ha_state()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        self._update_measured()
+        super()._handle_coordinator_update()
+
+    def _update_measured(self):
+        """Update from the coordinator data, recording how long it took."""
+        started = time.perf_counter()
+        self._update_from_data()
+        seconds = time.perf_counter() - started
+        if self._metrics is None:
+            self._metrics = SensorMetrics(lambda: self.extra_state_attributes)
+            self.coordinator.sensor_metrics[self.unique_id] = self._metrics
+        self._metrics.record_update(seconds)
+
+    @abstractmethod
+    def _update_from_data(self):
+        """Update the state and attributes from the coordinator data."""
+
+    def _set_data_attribute(self, data):
+        """Expose the history as attribute, unless it goes to statistics."""
+        if self.coordinator.statistics:
+            self._state_attributes["statistic_id"] = statistic_id(
+                self._facility_id, self._statistic_name
+            )
+        else:
+            self._state_attributes["data"] = data
+
 
+class GreenelyDailyUsageSensor(GreenelyCoordinatorEntity):
+    _statistic_name = "daily_usage"
+    # The state is yesterday's usage
+    _clock_pattern = {"hour": 0, "minute": 0, "second": 0}
 
-class GreenelyDailyUsageSensor(Entity):
-    def __init__(self, name, api, facility_id, usage_days, date_format, time_format):
+    def __init__(self, name, coordinator, facility_id, formatter):
+        super().__init__(coordinator)
         self._name = name
         self._icon = "mdi:lightning-bolt"
         self._state = 0
@@ -111,12 +171,10 @@ class GreenelyDailyUsageSensor(Entity):
             "last_reset": "1970-01-01T00:00:00+00:00",
         }
         self._unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
-        self._usage_days = usage_days
-        self._date_format = date_format
-        self._time_format = time_format
-        self._api = api
+        self._formatter = formatter
         self._device_class = SensorDeviceClass.ENERGY
         self._facility_id = facility_id
+        self._update_measured()
 
     @property
     def name(self):
@@ -164,20 +222,16 @@ class GreenelyDailyUsageSensor(Entity):
         """Return the class of the sensor."""
         return self._device_class
 
-    def update(self):
-        _LOGGER.debug("Checking jwt validity...")
-        if self._api.check_auth():
-            # Get todays date
-            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            _LOGGER.debug("Fetching daily usage data...")
-            data = []
-            startDate = today - timedelta(days=self._usage_days)
-            response = self._api.get_usage(startDate, today, False)
-            if response:
-                data = self.make_attributes(today, response)
-            self._state_attributes["data"] = data
-        else:
-            _LOGGER.error("Unable to log in!")
+    def _update_from_data(self):
+        if self.coordinator.data is None:
+            return
+        # Get todays date
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        data = []
+        response = self.coordinator.data.daily_usage
+        if response:
+            data = self.make_attributes(today, response)
+        self._set_data_attribute(data)
 
     def make_attributes(self, today, response):
         yesterday = today - timedelta(days=1)
@@ -186,8 +240,8 @@ class GreenelyDailyUsageSensor(Entity):
         if keys != None:
             for k in keys:
                 daily_data = {}
-                dateTime = datetime.strptime(response[k]["localtime"], "%Y-%m-%d %H:%M")
-                daily_data["localtime"] = dateTime.strftime(self._date_format)
+                dateTime, date, _ = self._formatter.localtime(response[k]["localtime"])
+                daily_data["localtime"] = date
                 usage = response[k]["usage"]
                 if dateTime == yesterday:
                     self._state = usage / 1000 if usage != None else 0
@@ -196,10 +250,13 @@ class GreenelyDailyUsageSensor(Entity):
         return data
 
 
-class GreenelyHourlyUsageSensor(Entity):
-    def __init__(
-        self, name, api, facility_id, hourly_offset_days, date_format, time_format
-    ):
+class GreenelyHourlyUsageSensor(GreenelyCoordinatorEntity):
+    _statistic_name = "hourly_usage"
+    # The state is the usage of this hour yesterday
+    _clock_pattern = {"minute": 0, "second": 0}
+
+    def __init__(self, name, coordinator, facility_id, formatter):
+        super().__init__(coordinator)
         self._name = name
         self._icon = "mdi:lightning-bolt"
         self._state = 0
@@ -208,12 +265,10 @@ class GreenelyHourlyUsageSensor(Entity):
             "last_reset": "1970-01-01T00:00:00+00:00",
         }
         self._unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
-        self._date_format = date_format
-        self._time_format = time_format
-        self._hourly_offset_days = hourly_offset_days
-        self._api = api
+        self._formatter = formatter
         self._device_class = SensorDeviceClass.ENERGY
         self._facility_id = facility_id
+        self._update_measured()
 
     @property
     def name(self):
@@ -261,20 +316,14 @@ class GreenelyHourlyUsageSensor(Entity):
         """Return the class of the sensor."""
         return self._device_class
 
-    def update(self):
-        _LOGGER.debug("Checking jwt validity...")
-        if self._api.check_auth():
-            # Get todays date
-            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            _LOGGER.debug("Fetching hourly usage data...")
-            data = []
-            startDate = today - timedelta(days=self._hourly_offset_days)
-            response = self._api.get_usage(startDate, today, True)
-            if response:
-                data = self.make_attributes(datetime.now(), response)
-            self._state_attributes["data"] = data
-        else:
-            _LOGGER.error("Unable to log in!")
+    def _update_from_data(self):
+        if self.coordinator.data is None:
+            return
+        data = []
+        response = self.coordinator.data.hourly_usage
+        if response:
+            data = self.make_attributes(datetime.now(), response)
+        self._set_data_attribute(data)
 
     def make_attributes(self, today, response):
         yesterday = today - timedelta(days=1)
@@ -283,12 +332,10 @@ class GreenelyHourlyUsageSensor(Entity):
         if keys != None:
             for k in keys:
                 hourly_data = {}
-                dateTime = datetime.strptime(response[k]["localtime"], "%Y-%m-%d %H:%M")
-                hourly_data["localtime"] = (
-                    dateTime.strftime(self._date_format)
-                    + " "
-                    + dateTime.strftime(self._time_format)
+                dateTime, date, time = self._formatter.localtime(
+                    response[k]["localtime"]
                 )
+                hourly_data["localtime"] = date + " " + time
                 usage = response[k]["usage"]
                 if (
                     dateTime.hour == yesterday.hour
@@ -302,20 +349,62 @@ class GreenelyHourlyUsageSensor(Entity):
         return data
 
 
-class GreenelyPricesSensor(Entity):
+class GreenelyPricesSensor(GreenelyCoordinatorEntity):
+    _statistic_name = "spot_price"
+    # The prices of whole days are kept out of the recorder, which would
+    # otherwise write them again at every change of the state
+    _unrecorded_attributes = frozenset(
+        {"previous_day", "current_day", "next_day", "price_analytics"}
+    )
+
     def __init__(
-        self, name, api, facility_id, date_format, time_format, homekit_compatible
+        self,
+        name,
+        coordinator,
+        facility_id,
+        formatter,
+        homekit_compatible,
+        window_hours,
     ):
+        super().__init__(coordinator)
         self._name = name
         self._icon = "mdi:account-cash"
         self._state = 0
         self._state_attributes = {}
         self._unit_of_measurement = "SEK/kWh" if homekit_compatible != True else "°C"
-        self._date_format = date_format
-        self._time_format = time_format
+        self._formatter = formatter
         self._homekit_compatible = homekit_compatible
-        self._api = api
+        self._window_hours = window_hours
         self._facility_id = facility_id
+        self._series = PriceSeries(array("d"), array("d"))
+        # Index of the cheapest price at or after each index of the series
+        self._cheapest_from = array("l")
+        # Rank and percentile of each price within its day
+        self._ranks = array("l")
+        self._percentiles = array("l")
+        # The day the day attributes and analytics were built for
+        self._day = None
+        self._update_measured()
+
+    async def async_added_to_hass(self) -> None:
+        """Move the state to the current price at every quarter of an hour."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_track_time_change(
+                self.hass, self._async_tick, minute=TICK_MINUTES, second=0
+            )
+        )
+
+    @callback
+    def _async_tick(self, now):
+        """Advance the state from the prices in memory, without any I/O."""
+        now = datetime.now()
+        if now.date() != self._day:
+            # After midnight, tomorrow's prices become today's before the
+            # coordinator next updates
+            self._set_days(now)
+        self._set_current(now)
+        self.async_write_ha_state()
 
     @property
     def name(self):
@@ -358,68 +447,146 @@ class GreenelyPricesSensor(Entity):
             entry_type="service",
         )
 
-    def update(self):
+    def _update_from_data(self):
         """Update state and attributes."""
-        _LOGGER.debug("Checking jwt validity...")
-        if self._api.check_auth():
-            data = self._api.get_price_data()
-            totalCost = 0
-            if data:
-                for d, value in data.items():
-                    cost = value["cost"]
-                    if cost != None:
-                        totalCost += cost
-                self._state_attributes["current_month"] = round(totalCost / 100000)
-            spot_price_data = self._api.get_spot_price()
-            if spot_price_data:
-                _LOGGER.debug("Fetching daily prices...")
-                today = datetime.now().replace(
-                    hour=0, minute=0, second=0, microsecond=0
-                )
-                todaysData = []
-                tomorrowsData = []
-                yesterdaysData = []
-                for d in spot_price_data["data"]:
-                    timestamp = datetime.strptime(
-                        spot_price_data["data"][d]["localtime"], "%Y-%m-%d %H:%M"
-                    )
-                    if timestamp.date() == today.date():
-                        if spot_price_data["data"][d]["price"] != None:
-                            todaysData.append(self.make_attribute(spot_price_data, d))
-                    elif timestamp.date() == (today.date() + timedelta(days=1)):
-                        if spot_price_data["data"][d]["price"] != None:
-                            tomorrowsData.append(
-                                self.make_attribute(spot_price_data, d)
-                            )
-                    elif timestamp.date() == (today.date() - timedelta(days=1)):
-                        if spot_price_data["data"][d]["price"] != None:
-                            yesterdaysData.append(
-                                self.make_attribute(spot_price_data, d)
-                            )
-                self._state_attributes["current_day"] = todaysData
-                self._state_attributes["next_day"] = tomorrowsData
-                self._state_attributes["previous_day"] = yesterdaysData
+        if self.coordinator.data is None:
+            return
+        data = self.coordinator.data.price_data
+        totalCost = 0
+        if data:
+            for d, value in data.items():
+                cost = value["cost"]
+                if cost != None:
+                    totalCost += cost
+            self._state_attributes["current_month"] = round(totalCost / 100000)
+        spot_price_data = self.coordinator.data.spot_price
+        if spot_price_data:
+            self._series = PriceSeries.from_response(
+                spot_price_data, self.coordinator.spot_price_step
+            )
+            self._cheapest_from = self.make_cheapest_from(self._series.prices)
+            now = datetime.now()
+            self._set_days(now)
+            self._set_current(now)
+
+    def _set_days(self, now):
+        """Set the analytics and the attributes of the days around now."""
+        self._day = now.date()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        yesterday_start = (today - timedelta(days=1)).timestamp()
+        today_start = today.timestamp()
+        tomorrow_start = (today + timedelta(days=1)).timestamp()
+        day_after_start = (today + timedelta(days=2)).timestamp()
+
+        self._ranks = array("l", [0]) * len(self._series)
+        self._percentiles = array("l", [0]) * len(self._series)
+        analytics = {}
+        for name, start, end in (
+            ("current_day", today_start, tomorrow_start),
+            ("next_day", tomorrow_start, day_after_start),
+        ):
+            indexes = self._series.between(start, end)
+            if indexes:
+                analytics[name] = self.make_analytics(indexes)
+        self._state_attributes["price_analytics"] = analytics
+
+        if self.coordinator.statistics:
+            self._state_attributes["statistic_id"] = statistic_id(
+                self._facility_id, self._statistic_name
+            )
         else:
-            _LOGGER.error("Unable to log in!")
+            self._state_attributes["current_day"] = self.make_attribute(
+                self._series.between(today_start, tomorrow_start)
+            )
+            self._state_attributes["next_day"] = self.make_attribute(
+                self._series.between(tomorrow_start, day_after_start)
+            )
+            self._state_attributes["previous_day"] = self.make_attribute(
+                self._series.between(yesterday_start, today_start)
+            )
 
-    def make_attribute(self, response, value):
-        if response:
-            newPoint = {}
-            today = datetime.now()
-            price = response["data"][value]["price"]
-            dt_object = datetime.strptime(
-                response["data"][value]["localtime"], "%Y-%m-%d %H:%M"
+    def _set_current(self, now):
+        """Set the state and the attributes that depend on the current hour."""
+        series = self._series
+        current = series.index_at(now.timestamp())
+        if current is None:
+            return
+        self._state = self.format_price(series.prices[current])
+        next_hour = (
+            now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        ).timestamp()
+        next_hour_price = series.mean(series.between(next_hour, next_hour + 3600))
+        self._state_attributes["next_hour_price"] = (
+            self.format_price(next_hour_price) if next_hour_price is not None else None
+        )
+        cheapest = self._cheapest_from[current]
+        self._state_attributes["hours_until_cheapest"] = round(
+            (series.starts[cheapest] - series.starts[current]) / 3600
+        )
+        self._state_attributes["current_rank"] = self._ranks[current]
+        self._state_attributes["current_percentile"] = self._percentiles[current]
+
+    @staticmethod
+    def make_cheapest_from(prices):
+        """Return the index of the cheapest price at or after each index."""
+        cheapest_from = array("l", [0]) * len(prices)
+        cheapest = len(prices) - 1
+        for i in range(len(prices) - 1, -1, -1):
+            if prices[i] <= prices[cheapest]:
+                cheapest = i
+            cheapest_from[i] = cheapest
+        return cheapest_from
+
+    def make_analytics(self, indexes):
+        """Summarize the prices of one day, and rank each of them.
+
+        The per hour lists follow the order of the day's prices attribute.
+        """
+        series = self._series
+        prices = [series.prices[i] for i in indexes]
+        ranks = series.ranks(indexes)
+        last = max(len(ranks) - 1, 1)
+        for i, rank in zip(indexes, ranks):
+            self._ranks[i] = rank
+            self._percentiles[i] = round((rank - 1) * 100 / last)
+        analytics = {
+            "min": self.format_price(min(prices)),
+            "max": self.format_price(max(prices)),
+            "mean": self.format_price(sum(prices) / len(prices)),
+            "rank": ranks,
+            "percentile": [self._percentiles[i] for i in indexes],
+        }
+        for hours in self._window_hours:
+            windows = series.windows(indexes, hours)
+            for name, first in zip(("cheapest", "most_expensive"), windows):
+                if first is not None:
+                    analytics[f"{name}_{hours}h"] = self.make_window(first, hours)
+        return analytics
+
+    def make_window(self, first, hours):
+        """Format the start and mean price of a window of hours."""
+        series = self._series
+        window = series.between(
+            series.starts[first], series.starts[first] + hours * 3600
+        )
+        date, time = self._formatter.timestamp(series.starts[first])
+        return {
+            "date": date,
+            "time": time,
+            "price": self.format_price(series.mean(window)),
+        }
+
+    def make_attribute(self, indexes):
+        """Format the prices at the given indexes of the series."""
+        starts = self._series.starts
+        prices = self._series.prices
+        data = []
+        for i in indexes:
+            date, time = self._formatter.timestamp(starts[i])
+            data.append(
+                {"date": date, "time": time, "price": self.format_price(prices[i])}
             )
-            newPoint["date"] = dt_object.strftime(self._date_format)
-            newPoint["time"] = dt_object.strftime(self._time_format)
-            if price != None:
-                rounded = self.format_price(price)
-                newPoint["price"] = rounded
-                if dt_object.hour == today.hour and dt_object.day == today.day:
-                    self._state = rounded
-            else:
-                newPoint["price"] = 0
-            return newPoint
+        return data
 
     def format_price(self, price):
         if self._homekit_compatible == True:
@@ -436,23 +603,20 @@ class GreenelyPricesSensor(Entity):
                 if price != None:
                     newPoint = {}
                     dt_object = datetime.utcfromtimestamp(point["timestamp"])
-                    newPoint["date"] = dt_object.strftime(self._date_format)
-                    newPoint["time"] = dt_object.strftime(self._time_format)
+                    newPoint["date"] = dt_object.strftime(self._formatter.date_format)
+                    newPoint["time"] = dt_object.strftime(self._formatter.time_format)
                     newPoint["price"] = str(price / 100)
                     data.append(newPoint)
             self._state_attributes[name] = data
 
 
-class GreenelyDailyProducedElecticitySensor(Entity):
-    def __init__(
-        self,
-        name,
-        api,
-        facility_id,
-        produced_electricity_days,
-        date_format,
-        time_format,
-    ):
+class GreenelyDailyProducedElecticitySensor(GreenelyCoordinatorEntity):
+    _statistic_name = "produced_electricity"
+    # The state is today's production
+    _clock_pattern = {"hour": 0, "minute": 0, "second": 0}
+
+    def __init__(self, name, coordinator, facility_id, formatter):
+        super().__init__(coordinator)
         self._name = name
         self._icon = "mdi:lightning-bolt"
         self._state = 0
@@ -460,13 +624,11 @@ class GreenelyDailyProducedElecticitySensor(Entity):
             "state_class": "measurement",
             "last_reset": "1970-01-01T00:00:00+00:00",
         }
-        self._produced_electricity_days = produced_electricity_days
         self._unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
-        self._date_format = date_format
-        self._time_format = time_format
-        self._api = api
+        self._formatter = formatter
         self._device_class = SensorDeviceClass.ENERGY
         self._facility_id = facility_id
+        self._update_measured()
 
     @property
     def name(self):
@@ -509,21 +671,16 @@ class GreenelyDailyProducedElecticitySensor(Entity):
             entry_type="service",
         )
 
-    def update(self):
-        _LOGGER.debug("Checking jwt validity...")
-        if self._api.check_auth():
-            # Get todays date
-            today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            _LOGGER.debug("Fetching daily produced electricity data...")
-            data = []
-            startDate = today - timedelta(days=(self._produced_electricity_days - 1))
-            endDate = today + timedelta(days=1)
-            response = self._api.get_produced_electricity(startDate, endDate, False)
-            if response:
-                data = self.make_attributes(today, response)
-            self._state_attributes["data"] = data
-        else:
-            _LOGGER.error("Unable to log in!")
+    def _update_from_data(self):
+        if self.coordinator.data is None:
+            return
+        # Get todays date
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        data = []
+        response = self.coordinator.data.produced_electricity
+        if response:
+            data = self.make_attributes(today, response)
+        self._set_data_attribute(data)
 
     def make_attributes(self, today, response):
         data = []
@@ -531,8 +688,8 @@ class GreenelyDailyProducedElecticitySensor(Entity):
         if keys != None:
             for k in keys:
                 daily_data = {}
-                dateTime = datetime.strptime(response[k]["localtime"], "%Y-%m-%d %H:%M")
-                daily_data["localtime"] = dateTime.strftime(self._date_format)
+                dateTime, date, _ = self._formatter.localtime(response[k]["localtime"])
+                daily_data["localtime"] = date
                 produced_electricity = response[k]["value"]
                 if dateTime == today:
                     self._state = (
@@ -545,3 +702,61 @@ class GreenelyDailyProducedElecticitySensor(Entity):
                 )
                 data.append(daily_data)
         return data
+
+
+class GreenelyApiDiagnosticSensor(SensorEntity):
+    """A metric of the Greenely API session, disabled by default."""
+
+    # Key -> name, unit and how to read it from the api
+    KEYS = {
+        "requests": (
+            "Greenely API Requests",
+            None,
+            lambda api: api.metrics.total_requests,
+        ),
+        "latency": (
+            "Greenely API Latency",
+            "ms",
+            lambda api: (
+                None
+                if api.metrics.latency_p90() is None
+                else round(api.metrics.latency_p90() * 1000, 1)
+            ),
+        ),
+        "cache_hit_rate": (
+            "Greenely API Cache Hit Rate",
+            "%",
+            lambda api: api.cache.hit_rate(),
+        ),
+        "logins": ("Greenely API Logins", None, lambda api: api.metrics.logins),
+    }
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, key, api, facility_id):
+        self._key = key
+        self._api = api
+        self._facility_id = facility_id
+        self._attr_name, self._attr_native_unit_of_measurement, self._value = self.KEYS[
+            key
+        ]
+        self._attr_unique_id = facility_id + "_api_" + key
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        """Return the device info."""
+        return DeviceInfo(
+            name="Greenely",
+            identifiers={(DOMAIN, self._facility_id)},
+            manufacturer="Greenely",
+            entry_type="service",
+        )
+
+    async def async_update(self):
+        """Read the metric, without any I/O."""
+        self._attr_native_value = self._value(self._api)
+        if self._key == "requests":
+            self._attr_extra_state_attributes = self._api.metrics.as_dict()
+        elif self._key == "cache_hit_rate":
+            self._attr_extra_state_attributes = self._api.cache.stats()
@@ -1,16 +1,30 @@
+from datetime import date, datetime, timedelta
 import logging
 import voluptuous as vol
 import json
+import httpx
 import homeassistant.helpers.config_validation as cv
 from homeassistant.components.notify import DOMAIN as NOTIFY_DOMAIN
+from homeassistant.config_entries import ConfigEntryState
 from homeassistant.const import CONF_PASSWORD, CONF_EMAIL
 from homeassistant.core import HomeAssistant, ServiceCall
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.helpers.httpx_client import get_async_client
 from .api import GreenelyApi
 from .const import DOMAIN
+from .export import FORMAT_CSV, FORMAT_PARQUET, async_export, parquet_available
 
 _LOGGER = logging.getLogger(__name__)
 
 SERVICE_FETCH_FACILITIES = "fetch_facilities"
+SERVICE_BACKFILL = "backfill"
+SERVICE_EXPORT = "export"
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_START_DATE = "start_date"
+ATTR_END_DATE = "end_date"
+ATTR_PATH = "path"
+ATTR_FORMAT = "format"
 
 SERVICE_FETCH_FACILITIES_SCHEMA = vol.Schema(
     {
@@ -20,6 +34,26 @@ SERVICE_FETCH_FACILITIES_SCHEMA = vol.Schema(
     }
 )
 
+SERVICE_BACKFILL_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_START_DATE): cv.date,
+        vol.Optional(ATTR_END_DATE): cv.date,
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    }
+)
+
+SERVICE_EXPORT_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_START_DATE): cv.date,
+        vol.Optional(ATTR_END_DATE): cv.date,
+        vol.Required(ATTR_PATH): cv.string,
+        vol.Optional(ATTR_FORMAT, default=FORMAT_CSV): vol.In(
+            [FORMAT_CSV, FORMAT_PARQUET]
+        ),
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    }
+)
+
 
 async def async_setup_services(hass: HomeAssistant) -> None:
     """Set up services for the Greenely integration."""
@@ -29,8 +63,13 @@ async def async_setup_services(hass: HomeAssistant) -> None:
         email = call.data[CONF_EMAIL]
         password = call.data[CONF_PASSWORD]
 
-        api = GreenelyApi(email, password)
-        if not api.check_auth():
+        api = GreenelyApi(email, password, get_async_client(hass))
+        try:
+            logged_in = await api.check_auth()
+            facilityIds = await api.get_facility_ids() if logged_in else None
+        except httpx.HTTPError as err:
+            raise HomeAssistantError(f"Unable to reach Greenely: {err}") from err
+        if not logged_in:
             await hass.services.async_call(
                 NOTIFY_DOMAIN,
                 "persistent_notification",
@@ -39,7 +78,6 @@ async def async_setup_services(hass: HomeAssistant) -> None:
             )
 
         else:
-            facilityIds = api.get_facility_ids()
             _LOGGER.info("Facilities fetched successfully")
 
             facilityIdsOutput = []
@@ -65,9 +103,68 @@ async def async_setup_services(hass: HomeAssistant) -> None:
                     blocking=True,
                 )
 
+    async def async_backfill(call: ServiceCall):
+        """Service to import the hourly history of a date range as statistics."""
+        start = call.data[ATTR_START_DATE]
+        end = call.data.get(ATTR_END_DATE, date.today())
+        for entry in _loaded_entries(hass, call.data.get(ATTR_CONFIG_ENTRY_ID)):
+            for coordinator in entry.runtime_data.coordinators.values():
+                await coordinator.async_backfill(start, end)
+        _LOGGER.info("Backfill from %s to %s is done", start, end)
+
+    async def async_export_history(call: ServiceCall):
+        """Service to write the hourly history of a date range to a file."""
+        path = call.data[ATTR_PATH]
+        file_format = call.data[ATTR_FORMAT]
+        if not hass.config.is_allowed_path(path):
+            raise ServiceValidationError(
+                f"Cannot write to {path}, it is not in allowlist_external_dirs"
+            )
+        if file_format == FORMAT_PARQUET and not parquet_available():
+            raise ServiceValidationError("Writing Parquet requires pyarrow")
+        start = call.data[ATTR_START_DATE]
+        end = call.data.get(ATTR_END_DATE, date.today())
+        coordinators = [
+            coordinator
+            for entry in _loaded_entries(hass, call.data.get(ATTR_CONFIG_ENTRY_ID))
+            for coordinator in entry.runtime_data.coordinators.values()
+        ]
+        rows = await async_export(
+            hass,
+            coordinators,
+            datetime.combine(start, datetime.min.time()),
+            datetime.combine(end + timedelta(days=1), datetime.min.time()),
+            path,
+            file_format,
+        )
+        _LOGGER.info("Exported %s rows from %s to %s to %s", rows, start, end, path)
+
     hass.services.async_register(
         DOMAIN,
         SERVICE_FETCH_FACILITIES,
         async_fetch_facilities,
         schema=SERVICE_FETCH_FACILITIES_SCHEMA,
     )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_BACKFILL,
+        async_backfill,
+        schema=SERVICE_BACKFILL_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT,
+        async_export_history,
+        schema=SERVICE_EXPORT_SCHEMA,
+    )
+
+
+def _loaded_entries(hass: HomeAssistant, entry_id: str | None):
+    """Return the loaded config entries, or only the one with entry_id."""
+    return [
+        entry
+        for entry in hass.config_entries.async_entries(DOMAIN)
+        if entry.state is ConfigEntryState.LOADED
+        and hasattr(entry, "runtime_data")
+        and entry_id in (None, entry.entry_id)
+    ]
@@ -0,0 +1,180 @@
+"""Long-term statistics for the Greenely integration."""
+
+from __future__ import annotations
+
+from datetime import datetime
+import logging
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    statistics_during_period,
+)
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .cache import REVISION_DAYS
+from .const import DOMAIN
+from .store import LOCALTIME_FORMAT, GreenelyStore
+
+PRICE_UNIT = "SEK/kWh"
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def statistic_id(facility_id: str, name: str) -> str:
+    """Return the id of an external statistic of a facility."""
+    return f"{DOMAIN}:{facility_id}_{name}"
+
+
+class StatisticsImporter:
+    """Append the new points of a facility to long-term statistics."""
+
+    def __init__(
+        self, hass: HomeAssistant, store: GreenelyStore, facility_id: str
+    ) -> None:
+        self._hass = hass
+        self._store = store
+        self._facility_id = facility_id
+
+    def state(self, name: str) -> dict:
+        """Return the last imported point and running sum of a statistic."""
+        statistics = self._store.facility(self._facility_id).setdefault(
+            "statistics", {}
+        )
+        return statistics.setdefault(name, {"last": None, "sum": 0.0})
+
+    async def async_sum_before(self, name: str, start: datetime) -> float:
+        """Return the running sum of a statistic at the last hour before start.
+
+        Monthly statistics hold the last sum of each month, so a few rows
+        cover the whole history before start.
+        """
+        statistic = statistic_id(self._facility_id, name)
+        rows = await get_instance(self._hass).async_add_executor_job(
+            statistics_during_period,
+            self._hass,
+            dt_util.utc_from_timestamp(0),
+            start.replace(tzinfo=dt_util.get_default_time_zone()),
+            {statistic},
+            "month",
+            None,
+            {"sum"},
+        )
+        sums = [row["sum"] for row in rows.get(statistic, []) if row["sum"] is not None]
+        return sums[-1] if sums else 0.0
+
+    def _may_be_published(self, localtime: str) -> bool:
+        """Return True if a missing point may still be filled by Greenely."""
+        day = datetime.strptime(localtime, LOCALTIME_FORMAT).date()
+        return (dt_util.now().date() - day).days < REVISION_DAYS
+
+    def _start(self, localtime: str) -> datetime:
+        return datetime.strptime(localtime, LOCALTIME_FORMAT).replace(
+            tzinfo=dt_util.get_default_time_zone()
+        )
+
+    @callback
+    def async_import_energy(
+        self,
+        name: str,
+        title: str,
+        response: dict,
+        value_key: str,
+        state: dict | None = None,
+        skip_missing: bool = False,
+    ) -> None:
+        """Import the energy points that were published since the last import.
+
+        A missing point stops the import until it is published, unless it is
+        older than the revision window, when it is a gap that is skipped. A
+        backfill passes its own state to build a separate running sum, and
+        skips all missing points instead of waiting for them.
+        """
+        if state is None:
+            state = self.state(name)
+        total = state["sum"]
+        last = state["last"]
+        statistics: list[StatisticData] = []
+        for point in response.values():
+            if last is not None and point["localtime"] <= last:
+                continue
+            value = point[value_key]
+            if value is None:
+                if skip_missing or not self._may_be_published(point["localtime"]):
+                    _LOGGER.debug(
+                        "Skipping the missing %s at %s", name, point["localtime"]
+                    )
+                    continue
+                break
+            total += value / 1000
+            last = point["localtime"]
+            statistics.append(
+                StatisticData(start=self._start(last), state=value / 1000, sum=total)
+            )
+        self._add(
+            name,
+            statistics,
+            StatisticMetaData(
+                has_mean=False,
+                has_sum=True,
+                name=f"{title} {self._facility_id}",
+                source=DOMAIN,
+                statistic_id=statistic_id(self._facility_id, name),
+                unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+            ),
+        )
+        state["last"] = last
+        state["sum"] = total
+
+    @callback
+    def async_import_prices(self, name: str, title: str, response: dict) -> None:
+        """Import the spot prices that were published since the last import.
+
+        Missing prices older than the revision window are skipped.
+        """
+        state = self.state(name)
+        last = state["last"]
+        statistics: list[StatisticData] = []
+        for point in response.get("data", {}).values():
+            if last is not None and point["localtime"] <= last:
+                continue
+            if point["price"] is None:
+                if not self._may_be_published(point["localtime"]):
+                    _LOGGER.debug(
+                        "Skipping the missing %s at %s", name, point["localtime"]
+                    )
+                    continue
+                break
+            price = round(point["price"] / 100000, 4)
+            last = point["localtime"]
+            statistics.append(
+                StatisticData(start=self._start(last), mean=price, min=price, max=price)
+            )
+        self._add(
+            name,
+            statistics,
+            StatisticMetaData(
+                has_mean=True,
+                has_sum=False,
+                name=f"{title} {self._facility_id}",
+                source=DOMAIN,
+                statistic_id=statistic_id(self._facility_id, name),
+                unit_of_measurement=PRICE_UNIT,
+            ),
+        )
+        state["last"] = last
+
+    def _add(
+        self,
+        name: str,
+        statistics: list[StatisticData],
+        metadata: StatisticMetaData,
+    ) -> None:
+        if not statistics:
+            return
+        _LOGGER.debug("Importing %s %s statistics", len(statistics), name)
+        async_add_external_statistics(self._hass, metadata, statistics)
+        self._store.async_schedule_save()
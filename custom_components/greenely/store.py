@@ -0,0 +1,243 @@
+"""Persistent storage for the Greenely integration."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .cache import REVISION_DAYS
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 30
+
+# A day of spot prices is final once every hour of it has a price
+MIN_PRICES_PER_DAY = 23
+
+HOUR_SECONDS = 3600
+DAY_SECONDS = 24 * HOUR_SECONDS
+
+LOCALTIME_FORMAT = "%Y-%m-%d %H:%M"
+
+
+class TimeSeries:
+    """Points of one series of one facility, keyed by localtime."""
+
+    def __init__(self, data: dict, value_key: str) -> None:
+        self._data = data
+        self._value_key = value_key
+        data.setdefault("first", None)
+        data.setdefault("last", None)
+        data.setdefault("points", {})
+
+    def fetch_start(self, start: datetime) -> datetime:
+        """Return where to start fetching to have all points since start."""
+        first = self._data["first"]
+        last = self._data["last"]
+        if first is None or start < datetime.fromisoformat(first):
+            return start
+        if last is None:
+            return datetime.fromisoformat(first)
+        last_day = datetime.strptime(last, LOCALTIME_FORMAT).replace(hour=0, minute=0)
+        return max(start, last_day - timedelta(days=REVISION_DAYS))
+
+    def add(self, localtime: str, value) -> None:
+        """Add or revise a single fetched point."""
+        self._data["points"][localtime] = value
+
+    def commit(self, start: datetime, fetched_from: datetime) -> None:
+        """Record a fetch since fetched_from, dropping the points before start."""
+        points = self._data["points"]
+        first = self._data["first"]
+        if first is None or fetched_from < datetime.fromisoformat(first):
+            first = fetched_from.isoformat()
+        first = max(datetime.fromisoformat(first), start)
+        self._data["first"] = first.isoformat()
+
+        cutoff = start.strftime(LOCALTIME_FORMAT)
+        for localtime in [k for k in points if k < cutoff]:
+            del points[localtime]
+        self._data["last"] = max(
+            (k for k, v in points.items() if v is not None), default=None
+        )
+
+    def window(self, start: datetime) -> dict:
+        """Return the points since start, shaped like an API response."""
+        cutoff = start.strftime(LOCALTIME_FORMAT)
+        return {
+            localtime: {"localtime": localtime, self._value_key: value}
+            for localtime, value in sorted(self._data["points"].items())
+            if localtime >= cutoff
+        }
+
+
+class SpotPriceCache:
+    """Spot prices of one facility, keyed by day.
+
+    Each day is an array of prices at a fixed step from midnight, with None
+    for the prices that are not published, so no timestamps are stored.
+    """
+
+    def __init__(self, data: dict, step: int = HOUR_SECONDS) -> None:
+        self._days = data
+        self._step = step
+
+    def _prices(self, day: date) -> list | None:
+        """Return the prices of a day, if stored at this step."""
+        stored = self._days.get(day.isoformat())
+        if not isinstance(stored, dict) or stored.get("step") != self._step:
+            # Days stored at another resolution are fetched again
+            return None
+        return stored["prices"]
+
+    def is_final(self, day: date) -> bool:
+        """Return True if all prices of a day have been published."""
+        prices = self._prices(day)
+        return prices is not None and sum(
+            price is not None for price in prices
+        ) >= MIN_PRICES_PER_DAY * (HOUR_SECONDS // self._step)
+
+    def missing_days(self, days: list[date]) -> list[date]:
+        """Return the days that still have to be fetched."""
+        return [day for day in days if not self.is_final(day)]
+
+    def merge(self, response: dict, days: list[date]) -> None:
+        """Merge a fetched spot price response for the given days."""
+        fetched = {
+            day.isoformat(): {
+                "step": self._step,
+                "prices": [None] * (DAY_SECONDS // self._step),
+            }
+            for day in days
+        }
+        for point in response.get("data", {}).values():
+            localtime = point["localtime"]
+            stored = fetched.get(localtime[:10])
+            if stored is not None:
+                seconds = (
+                    int(localtime[11:13]) * HOUR_SECONDS + int(localtime[14:16]) * 60
+                )
+                stored["prices"][seconds // self._step] = point["price"]
+        self._days.update(fetched)
+
+    def response(self, days: list[date], step: int | None = None) -> dict:
+        """Return the prices of the given days, shaped like an API response.
+
+        With a longer step than the stored one, each price is the mean of
+        the stored prices within it, like hourly prices from quarter-hours.
+        """
+        step = step or self._step
+        group = step // self._step
+        data = {}
+        for day in days:
+            prices = self._prices(day) or []
+            for index in range(0, len(prices), group):
+                known = [p for p in prices[index : index + group] if p is not None]
+                if not known:
+                    continue
+                minutes = index * self._step // 60
+                localtime = f"{day.isoformat()} {minutes // 60:02d}:{minutes % 60:02d}"
+                data[localtime] = {
+                    "localtime": localtime,
+                    "price": sum(known) / len(known),
+                }
+        return {"data": data}
+
+    def prune(self, first_day: date) -> None:
+        """Drop the days before first_day."""
+        for day in [d for d in self._days if d < first_day.isoformat()]:
+            del self._days[day]
+
+
+class MonthCost:
+    """Daily costs of one facility in the current month.
+
+    Greenely may still revise the cost of yesterday and today, but not of the
+    days before, so only those two days have to be fetched again.
+    """
+
+    def __init__(self, data: dict) -> None:
+        self._data = data
+        data.setdefault("month", None)
+        data.setdefault("days", {})
+
+    def fetch_start(self, today: date) -> date:
+        """Return the first day to fetch, starting a new month if needed."""
+        first = today.replace(day=1)
+        if self._data["month"] != first.isoformat()[:7]:
+            self._data["month"] = first.isoformat()[:7]
+            self._data["days"] = {}
+        day = first
+        revised = max(first, today - timedelta(days=REVISION_DAYS - 1))
+        while day < revised and self._data["days"].get(day.isoformat()) is not None:
+            day += timedelta(days=1)
+        return day
+
+    def merge(self, response: dict) -> None:
+        """Merge the fetched daily costs of the current month."""
+        month = self._data["month"]
+        for point in response.values():
+            if point["localtime"][:7] == month:
+                self._data["days"][point["localtime"][:10]] = point["cost"]
+
+    def response(self, today: date) -> dict:
+        """Return the costs of the month, shaped like an API response."""
+        if self._data["month"] != today.isoformat()[:7]:
+            return {}
+        return {
+            day: {"localtime": day + " 00:00", "cost": cost}
+            for day, cost in sorted(self._data["days"].items())
+        }
+
+
+class GreenelyStore:
+    """Data of a config entry that is kept across restarts."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        self._store: Store[dict] = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self._data: dict = {}
+
+    async def async_load(self) -> None:
+        """Load the stored data."""
+        self._data = await self._store.async_load() or {}
+
+    async def async_remove(self) -> None:
+        """Remove the stored data."""
+        await self._store.async_remove()
+
+    async def async_flush(self) -> None:
+        """Save the data now, instead of after the delay."""
+        await self._store.async_save(self._data)
+
+    @callback
+    def async_schedule_save(self) -> None:
+        """Save the data after a short delay."""
+        self._store.async_delay_save(lambda: self._data, SAVE_DELAY)
+
+    def account(self) -> dict:
+        """Return the stored data of the account, like its facilities."""
+        return self._data.setdefault("account", {})
+
+    def has_facility(self, facility_id: str) -> bool:
+        """Return True if data of a facility has been stored."""
+        return str(facility_id) in self._data.get("facilities", {})
+
+    def facility(self, facility_id: str) -> dict:
+        """Return the stored data of a facility."""
+        return self._data.setdefault("facilities", {}).setdefault(str(facility_id), {})
+
+    def series(self, facility_id: str, name: str, value_key: str) -> TimeSeries:
+        """Return a stored time series of a facility."""
+        return TimeSeries(self.facility(facility_id).setdefault(name, {}), value_key)
+
+    def month_cost(self, facility_id: str) -> MonthCost:
+        """Return the costs of the current month of a facility."""
+        return MonthCost(self.facility(facility_id).setdefault("month_cost", {}))
+
+    def spot_prices(self, facility_id: str, step: int = HOUR_SECONDS) -> SpotPriceCache:
+        """Return the cached spot prices of a facility, at a step in seconds."""
+        return SpotPriceCache(
+            self.facility(facility_id).setdefault("spot_price", {}), step
+        )
@@ -0,0 +1,111 @@
+"""Incremental decoding of Greenely responses."""
+
+from __future__ import annotations
+
+from collections.abc import AsyncIterator
+import json
+import re
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_NUMBER_START = frozenset("-0123456789")
+_NUMBER_CHARS = frozenset("+-.0123456789eE")
+
+
+class _NeedMore(Exception):
+    """The buffer ends before the next token does."""
+
+
+class _Buffer:
+    """Text received so far, and how much of it has been consumed."""
+
+    def __init__(self, chunks: AsyncIterator[str]) -> None:
+        self._chunks = chunks
+        self.text = ""
+        self.pos = 0
+
+    async def fill(self) -> None:
+        """Append the next chunk, dropping what has been consumed."""
+        try:
+            chunk = await anext(self._chunks)
+        except StopAsyncIteration:
+            raise json.JSONDecodeError(
+                "Unexpected end of data", self.text, self.pos
+            ) from None
+        self.text = self.text[self.pos :] + chunk
+        self.pos = 0
+
+    def skip(self) -> str:
+        """Skip whitespace and return the next character."""
+        self.pos = _WHITESPACE.match(self.text, self.pos).end()
+        if self.pos == len(self.text):
+            raise _NeedMore
+        return self.text[self.pos]
+
+    def value(self):
+        """Decode the next JSON value."""
+        self.skip()
+        try:
+            value, end = _DECODER.raw_decode(self.text, self.pos)
+        except json.JSONDecodeError as err:
+            # A value cut off by the end of the chunk fails at or near its end
+            raise _NeedMore from err
+        if self.text[self.pos] in _NUMBER_START and (
+            end == len(self.text) or self.text[end] in _NUMBER_CHARS
+        ):
+            # A number is only complete once a character that cannot be part
+            # of it follows, "1234." may continue as "1234.5" in the next chunk
+            raise _NeedMore
+        self.pos = end
+        return value
+
+    def expect(self, chars: str) -> str:
+        """Consume one of chars and return it."""
+        char = self.skip()
+        if char not in chars:
+            raise json.JSONDecodeError(
+                f"Expected one of {chars!r}", self.text, self.pos
+            )
+        self.pos += 1
+        return char
+
+
+async def _next(buffer: _Buffer, read):
+    """Call read on the buffer, filling it until it has enough text."""
+    while True:
+        start = buffer.pos
+        try:
+            return read()
+        except _NeedMore:
+            buffer.pos = start
+            await buffer.fill()
+
+
+async def iter_data(chunks: AsyncIterator[str]) -> AsyncIterator[tuple[str, dict]]:
+    """Yield the items of the "data" object of a response as they arrive.
+
+    Only one point is decoded at a time, so the whole mapping is never held
+    in memory. The other members of the response are decoded and skipped.
+    """
+    buffer = _Buffer(chunks)
+    await _next(buffer, lambda: buffer.expect("{"))
+    if await _next(buffer, buffer.skip) == "}":
+        return
+    while True:
+        key = await _next(buffer, buffer.value)
+        await _next(buffer, lambda: buffer.expect(":"))
+        if key == "data" and await _next(buffer, buffer.skip) == "{":
+            buffer.pos += 1
+            if await _next(buffer, buffer.skip) == "}":
+                buffer.pos += 1
+            else:
+                while True:
+                    item_key = await _next(buffer, buffer.value)
+                    await _next(buffer, lambda: buffer.expect(":"))
+                    yield item_key, await _next(buffer, buffer.value)
+                    if await _next(buffer, lambda: buffer.expect(",}")) == "}":
+                        break
+        else:
+            await _next(buffer, buffer.value)
+        if await _next(buffer, lambda: buffer.expect(",}")) == "}":
+            return
@@ -0,0 +1,149 @@
+"""Tests of the requests of the Greenely API client."""
+
+import asyncio
+from collections import Counter
+from contextlib import aclosing
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from custom_components.greenely import api as api_module
+from custom_components.greenely.resilience import (
+    FAILURE_THRESHOLD,
+    MAX_RETRIES,
+    CircuitOpenError,
+)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(api_module, "backoff_delay", lambda attempt: 0.0)
+
+
+def _api(handler) -> tuple[api_module.GreenelyApi, Counter]:
+    requests = Counter()
+
+    def count(request: httpx.Request) -> httpx.Response:
+        requests[request.url.path.rstrip("/").rsplit("/", 1)[-1]] += 1
+        return handler(request)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(count))
+    return api_module.GreenelyApi("email", "password", client), requests
+
+
+def _failing_spot_price(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/spot-price"):
+        return httpx.Response(503)
+    return httpx.Response(200, json={"data": []})
+
+
+def test_retries_of_one_request_count_as_one_failure():
+    api, requests = _api(_failing_spot_price)
+
+    async def run():
+        for _ in range(FAILURE_THRESHOLD - 1):
+            assert await api.get_spot_price("1") == {}
+        # Other endpoints of the host are still reachable
+        assert await api.get_facility_ids() == []
+
+    asyncio.run(run())
+    assert requests["spot-price"] == (FAILURE_THRESHOLD - 1) * (MAX_RETRIES + 1)
+    assert requests["facilities"] == 1
+
+
+def test_circuit_opens_after_failed_requests():
+    api, requests = _api(_failing_spot_price)
+
+    async def run():
+        for _ in range(FAILURE_THRESHOLD):
+            await api.get_spot_price("1")
+        with pytest.raises(CircuitOpenError):
+            await api.get_facility_ids()
+
+    asyncio.run(run())
+    assert requests["facilities"] == 0
+
+
+def test_success_after_retries_resets_the_failures():
+    failures = []
+
+    def flaky(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/spot-price") and failures.pop():
+            return httpx.Response(503)
+        return httpx.Response(200, json={"data": []})
+
+    api, requests = _api(flaky)
+
+    async def run():
+        failures.extend([True] * (MAX_RETRIES + 1) * (FAILURE_THRESHOLD - 1))
+        for _ in range(FAILURE_THRESHOLD - 1):
+            await api.get_spot_price("1")
+        # Only the last attempt succeeds
+        failures.extend([False] + [True] * MAX_RETRIES)
+        assert await api.get_spot_price("1") == {"data": []}
+        api.cache.clear()
+        failures.extend([True] * (MAX_RETRIES + 1) * (FAILURE_THRESHOLD - 1))
+        for _ in range(FAILURE_THRESHOLD - 1):
+            await api.get_spot_price("1")
+        assert await api.get_facility_ids() == []
+
+    asyncio.run(run())
+    assert requests["facilities"] == 1
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: list[bytes]) -> None:
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+def test_closing_a_stream_closes_its_response():
+    body = _TrackedStream(
+        [
+            b'{"data": {"1": {"localtime": "2024-05-01 00:00", "usage": 1},',
+            b' "2": {"localtime": "2024-05-01 01:00", "usage": 2}}}',
+        ]
+    )
+    api, _ = _api(lambda request: httpx.Response(200, stream=body))
+    start = datetime(2024, 5, 1)
+
+    async def run():
+        async with aclosing(
+            api.stream_usage("1", start, start + timedelta(days=1), True)
+        ) as points:
+            async for point in points:
+                assert point == ("2024-05-01 00:00", 1)
+                break
+        # Before the event loop finalizes the abandoned generators
+        assert body.closed
+
+    asyncio.run(run())
+
+
+def test_login_is_retried_and_raises_once_the_retries_run_out():
+    def unreachable(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("Name or service not known", request=request)
+
+    api, requests = _api(unreachable)
+
+    async def run():
+        with pytest.raises(httpx.ConnectError):
+            await api.check_auth()
+
+    asyncio.run(run())
+    assert requests["login"] == MAX_RETRIES + 1
+
+
+def test_rejected_login_does_not_log_in_again():
+    api, requests = _api(lambda request: httpx.Response(401, text="bad password"))
+
+    assert asyncio.run(api.check_auth()) is False
+    assert requests["login"] == 1
@@ -0,0 +1,64 @@
+"""Tests of the response cache of the Greenely API."""
+
+from datetime import date
+
+import httpx
+import pytest
+
+from custom_components.greenely.cache import (
+    CURRENCY_TTL,
+    FACILITIES_TTL,
+    RECENT_TTL,
+    REVISION_DAYS,
+    ResponseCache,
+    freshness,
+)
+
+FACILITIES = "https://api2.greenely.com/v1/facilities/"
+CHECKAUTH = "https://api2.greenely.com/v1/checkauth"
+CONSUMPTION = (
+    "https://api2.greenely.com/v1/facilities/1/consumption"
+    "?from=2024-5-1&to=2024-5-{day}&resolution=hourly"
+)
+TODAY = date(2024, 5, 20)
+
+
+def test_hit_rate_is_a_percentage_everywhere():
+    cache = ResponseCache()
+    cache.store(FACILITIES, httpx.Response(200), {"data": []})
+    for _ in range(5):
+        assert cache.fresh(FACILITIES) == {"data": []}
+    cache.store(CHECKAUTH, httpx.Response(200), {})
+
+    assert cache.stats()["facilities"]["hit_rate"] == 83.3
+    assert cache.stats()["checkauth"]["hit_rate"] == 0.0
+    assert cache.hit_rate("facilities") == 83.3
+    assert cache.hit_rate() == 71.4
+
+
+def test_hit_rate_without_lookups():
+    assert ResponseCache().hit_rate() is None
+
+
+@pytest.mark.parametrize(
+    ("day", "ttl"),
+    [
+        (20 - REVISION_DAYS - 1, 0),
+        (20 - REVISION_DAYS, 0),
+        (20 - REVISION_DAYS + 1, RECENT_TTL),
+        (20, RECENT_TTL),
+        (21, RECENT_TTL),
+    ],
+)
+def test_ranges_of_closed_days_are_not_cached(day, ttl):
+    assert freshness(CONSUMPTION.format(day=day), TODAY) == ttl
+
+
+def test_freshness_per_endpoint():
+    currency = CONSUMPTION.format(day=1) + "&unit=currency"
+
+    assert freshness(FACILITIES, TODAY) == FACILITIES_TTL
+    assert freshness(CHECKAUTH, TODAY) == 0
+    # Costs of the month are short lived, however old the range
+    assert freshness(currency, TODAY) == CURRENCY_TTL
+    assert freshness(FACILITIES + "1/consumption?from=2024-5-1", TODAY) == 0
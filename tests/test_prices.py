@@ -0,0 +1,155 @@
+"""Tests of the spot price series and the analytics of the prices sensor."""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from custom_components.greenely.formatting import LocaltimeFormatter
+from custom_components.greenely.prices import PriceSeries, parse_window_hours
+
+DAY = datetime(2024, 5, 20)
+
+
+def _response(day: datetime, prices: list, step: int = 3600) -> dict:
+    data = {}
+    for index, price in enumerate(prices):
+        localtime = (day + timedelta(seconds=index * step)).strftime("%Y-%m-%d %H:%M")
+        data[localtime] = {"localtime": localtime, "price": price}
+    return {"data": data}
+
+
+def _series(prices: list, step: int = 3600) -> PriceSeries:
+    return PriceSeries.from_response(_response(DAY, prices, step), step)
+
+
+def test_from_response_skips_missing_prices():
+    series = _series([3, None, 1])
+
+    assert list(series.prices) == [3, 1]
+    assert series.starts[1] - series.starts[0] == 2 * 3600
+
+
+def test_index_at_a_missing_hour():
+    series = _series([3, None, 1])
+    start = DAY.timestamp()
+
+    assert series.index_at(start + 1800) == 0
+    assert series.index_at(start + 3600) is None
+    assert series.index_at(start + 2 * 3600) == 1
+    assert series.index_at(start + 3 * 3600) is None
+
+
+def test_windows_do_not_span_a_missing_hour():
+    # Hour 2 is missing, so hours 1 and 3 are not a window of two hours
+    series = _series([10, 1, None, 1, 10, 10])
+
+    cheapest, most_expensive = series.windows(range(len(series)), 2)
+
+    assert series.starts[cheapest] == DAY.timestamp()
+    assert series.starts[most_expensive] == (DAY + timedelta(hours=4)).timestamp()
+
+
+def test_windows_longer_than_any_run():
+    series = _series([1, 2, None, 3, 4])
+
+    assert series.windows(range(len(series)), 3) == (None, None)
+
+
+def test_windows_of_quarter_hours():
+    series = _series([4, 4, 4, 4, 1, 1, 1, 1, 2, 2, 2, 2], 900)
+
+    cheapest, most_expensive = series.windows(range(len(series)), 1)
+
+    assert (cheapest, most_expensive) == (4, 0)
+    assert series.mean(series.between(series.starts[4], series.starts[8])) == 1
+
+
+def test_ranks_share_ties():
+    series = _series([5, 3, 5, 1])
+
+    assert series.ranks(range(4)) == [3, 2, 3, 1]
+
+
+def test_ranks_of_a_later_day():
+    series = _series([9, 9, 2, 7, 2])
+
+    assert series.ranks(range(2, 5)) == [1, 3, 1]
+
+
+def test_parse_window_hours():
+    assert parse_window_hours("3, 1,x,25,0,3") == [1, 3]
+
+
+def _prices_sensor(spot_price: dict):
+    from custom_components.greenely.sensor import GreenelyPricesSensor
+
+    coordinator = SimpleNamespace(
+        statistics=False,
+        sensor_metrics={},
+        spot_price_step=3600,
+        data=SimpleNamespace(price_data={}, spot_price=spot_price),
+    )
+    return GreenelyPricesSensor(
+        "prices",
+        coordinator,
+        "12345",
+        LocaltimeFormatter("%Y-%m-%d", "%H:%M"),
+        False,
+        [2],
+    )
+
+
+def test_price_analytics_of_today():
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    prices = [100000.0] * 24
+    prices[3] = None
+    prices[1] = prices[4] = 50000.0
+    prices[20] = prices[21] = 300000.0
+    sensor = _prices_sensor(_response(today, prices))
+
+    analytics = sensor.extra_state_attributes["price_analytics"]["current_day"]
+    assert analytics["min"] == 0.5
+    assert analytics["max"] == 3.0
+    assert len(analytics["rank"]) == 23
+    # The two cheapest hours share the first rank, the missing hour has none
+    assert analytics["rank"][:4] == [3, 1, 3, 1]
+    assert analytics["percentile"][1] == 0
+    # Equal prices share the percentile of the first of them
+    assert analytics["percentile"][19] == analytics["percentile"][20] == 95
+    # Hours 1 and 4 are the cheapest, but the missing hour 3 is between them
+    assert analytics["cheapest_2h"]["time"] == "00:00"
+    assert analytics["most_expensive_2h"] == {
+        "date": today.strftime("%Y-%m-%d"),
+        "time": "20:00",
+        "price": 3.0,
+    }
+    assert len(sensor.extra_state_attributes["current_day"]) == 23
+
+
+def test_tick_after_midnight_moves_the_days(monkeypatch):
+    from custom_components.greenely import sensor as sensor_module
+
+    now = [DAY + timedelta(hours=23, minutes=45)]
+
+    class Clock(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return now[0]
+
+    monkeypatch.setattr(sensor_module, "datetime", Clock)
+    response = _response(DAY - timedelta(days=1), [100000.0] * 48 + [200000.0] * 24)
+    sensor = _prices_sensor(response)
+    sensor.async_write_ha_state = lambda: None
+    attributes = sensor.extra_state_attributes
+    assert attributes["current_day"][0]["date"] == "2024-05-20"
+    assert attributes["price_analytics"]["next_day"]["min"] == 2.0
+
+    now[0] = DAY + timedelta(days=1)
+    sensor._async_tick(now[0])
+
+    assert sensor.state == 2.0
+    assert attributes["previous_day"][0]["date"] == "2024-05-20"
+    assert attributes["current_day"][0]["date"] == "2024-05-21"
+    assert attributes["next_day"] == []
+    assert attributes["price_analytics"]["current_day"]["min"] == 2.0
+    assert "next_day" not in attributes["price_analytics"]
+    assert attributes["current_rank"] == 1
@@ -0,0 +1,103 @@
+"""Tests of the retry helpers and the circuit breaker."""
+
+import httpx
+import pytest
+
+from custom_components.greenely import resilience
+from custom_components.greenely.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    is_transient,
+    retry_after,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_circuit_opens_at_the_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.check("host")
+
+    breaker.record_failure()
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.check("host")
+
+
+def test_success_resets_the_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert not breaker.is_open
+
+
+def test_half_open_trial_that_succeeds_closes_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    _open(breaker)
+
+    clock[0] += 60
+    # The first request after the timeout is the trial
+    breaker.check("host")
+    # The others are rejected while the trial is running
+    with pytest.raises(CircuitOpenError):
+        breaker.check("host")
+
+    breaker.record_success()
+    assert not breaker.is_open
+    breaker.check("host")
+    breaker.check("host")
+
+
+def test_half_open_trial_that_fails_opens_the_circuit_again(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    _open(breaker)
+
+    clock[0] += 60
+    breaker.check("host")
+    clock[0] += 10
+    breaker.record_failure()
+
+    assert breaker.is_open
+    clock[0] += 59
+    with pytest.raises(CircuitOpenError):
+        breaker.check("host")
+    clock[0] += 1
+    breaker.check("host")
+
+
+@pytest.mark.parametrize(
+    ("status", "transient"),
+    [(200, False), (401, False), (404, False), (429, True), (500, True), (503, True)],
+)
+def test_is_transient(status, transient):
+    assert is_transient(httpx.Response(status)) is transient
+
+
+def test_retry_after_in_seconds_or_as_a_date():
+    assert retry_after(httpx.Response(503, headers={"Retry-After": "7"})) == 7.0
+    assert (
+        retry_after(
+            httpx.Response(
+                503, headers={"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+            )
+        )
+        == 0.0
+    )
+    assert retry_after(httpx.Response(503, headers={"Retry-After": "soon"})) is None
+    assert retry_after(httpx.Response(503)) is None
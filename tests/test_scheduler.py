@@ -0,0 +1,59 @@
+"""Tests of the fetch schedule of the Greenely data types."""
+
+from datetime import datetime, timedelta
+
+from custom_components.greenely.scheduler import (
+    DAILY_PUBLICATION_DELAY,
+    HOURLY_PUBLICATION_DELAY,
+    SCHEDULES,
+    FetchSchedule,
+    last_publication,
+)
+
+HOURLY = {name for name, (period, _) in SCHEDULES.items() if period.seconds == 3600}
+MIDNIGHT = datetime(2024, 5, 20)
+
+
+def test_everything_is_due_at_first():
+    assert FetchSchedule().due(MIDNIGHT) == set(SCHEDULES)
+
+
+def test_hourly_data_is_due_after_its_publication_delay():
+    schedule = FetchSchedule()
+    fetched = MIDNIGHT + timedelta(hours=10, minutes=40)
+    schedule.fetched(set(SCHEDULES), fetched)
+    publication = MIDNIGHT + timedelta(hours=11) + HOURLY_PUBLICATION_DELAY
+
+    assert schedule.due(fetched) == set()
+    assert schedule.due(publication - timedelta(minutes=1)) == set()
+    assert schedule.due(publication) == HOURLY
+
+
+def test_daily_usage_is_due_after_its_publication_delay():
+    schedule = FetchSchedule()
+    fetched = MIDNIGHT + DAILY_PUBLICATION_DELAY + timedelta(minutes=5)
+    schedule.fetched(set(SCHEDULES), fetched)
+    publication = MIDNIGHT + timedelta(days=1) + DAILY_PUBLICATION_DELAY
+
+    assert "daily_usage" not in schedule.due(publication - timedelta(minutes=1))
+    assert "daily_usage" in schedule.due(publication)
+
+
+def test_fetched_before_the_publication_is_due_again():
+    schedule = FetchSchedule()
+    # Fetched at 00:15, before yesterday was published at 06:00
+    schedule.fetched({"daily_usage"}, MIDNIGHT + timedelta(minutes=15))
+
+    assert "daily_usage" not in schedule.due(MIDNIGHT + timedelta(hours=5))
+    assert "daily_usage" in schedule.due(MIDNIGHT + DAILY_PUBLICATION_DELAY)
+
+
+def test_last_publication_before_the_delay_of_the_first_period():
+    now = MIDNIGHT + timedelta(minutes=10)
+
+    assert last_publication(now, timedelta(hours=1), HOURLY_PUBLICATION_DELAY) == (
+        MIDNIGHT - timedelta(hours=1) + HOURLY_PUBLICATION_DELAY
+    )
+    assert last_publication(now, timedelta(days=1), DAILY_PUBLICATION_DELAY) == (
+        MIDNIGHT - timedelta(days=1) + DAILY_PUBLICATION_DELAY
+    )
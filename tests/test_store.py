@@ -0,0 +1,150 @@
+"""Tests of the stored series, spot prices and costs of a facility."""
+
+from datetime import date, datetime
+
+from custom_components.greenely.cache import REVISION_DAYS
+from custom_components.greenely.store import (
+    HOUR_SECONDS,
+    MIN_PRICES_PER_DAY,
+    MonthCost,
+    SpotPriceCache,
+    TimeSeries,
+)
+
+QUARTER_SECONDS = 15 * 60
+
+
+def _hours(day: str, count: int, value=1) -> dict:
+    return {
+        f"{day} {hour:02d}:00": {"localtime": f"{day} {hour:02d}:00", "price": value}
+        for hour in range(count)
+    }
+
+
+def test_fetch_start_of_an_empty_series():
+    series = TimeSeries({}, "usage")
+
+    assert series.fetch_start(datetime(2024, 5, 1)) == datetime(2024, 5, 1)
+
+
+def test_fetch_start_after_a_partial_day():
+    series = TimeSeries({}, "usage")
+    for hour in range(24):
+        series.add(f"2024-05-10 {hour:02d}:00", 100 if hour < 14 else None)
+    series.commit(datetime(2024, 5, 1), datetime(2024, 5, 1))
+
+    # The revision window counts back from the day of the last known point
+    assert series.fetch_start(datetime(2024, 5, 1)) == datetime(
+        2024, 5, 10 - REVISION_DAYS
+    )
+    # The window never starts before what the sensor asks for
+    assert series.fetch_start(datetime(2024, 5, 9)) == datetime(2024, 5, 9)
+    # A longer window has to be fetched from its start
+    assert series.fetch_start(datetime(2024, 4, 1)) == datetime(2024, 4, 1)
+
+
+def test_fetch_start_without_any_known_point():
+    series = TimeSeries({}, "usage")
+    series.add("2024-05-10 00:00", None)
+    series.commit(datetime(2024, 5, 5), datetime(2024, 5, 5))
+
+    assert series.fetch_start(datetime(2024, 5, 5)) == datetime(2024, 5, 5)
+
+
+def test_commit_drops_the_points_before_the_window():
+    data = {}
+    series = TimeSeries(data, "usage")
+    series.add("2024-04-30 23:00", 1)
+    series.add("2024-05-01 00:00", 2)
+    series.commit(datetime(2024, 5, 1), datetime(2024, 4, 30))
+
+    assert series.window(datetime(2024, 4, 1)) == {
+        "2024-05-01 00:00": {"localtime": "2024-05-01 00:00", "usage": 2}
+    }
+    assert data["first"] == "2024-05-01T00:00:00"
+
+
+def test_month_cost_rolls_over_to_a_new_month():
+    data = {}
+    month_cost = MonthCost(data)
+    assert month_cost.fetch_start(date(2024, 5, 30)) == date(2024, 5, 1)
+    month_cost.merge(
+        {
+            f"2024-05-{day:02d}": {"localtime": f"2024-05-{day:02d} 00:00", "cost": 10}
+            for day in range(1, 31)
+        }
+    )
+    assert len(month_cost.response(date(2024, 5, 30))) == 30
+
+    # The first day of the next month starts over
+    assert month_cost.fetch_start(date(2024, 6, 1)) == date(2024, 6, 1)
+    month_cost.merge(
+        {
+            "2024-05-31": {"localtime": "2024-05-31 00:00", "cost": 10},
+            "2024-06-01": {"localtime": "2024-06-01 00:00", "cost": 20},
+        }
+    )
+    assert month_cost.response(date(2024, 6, 1)) == {
+        "2024-06-01": {"localtime": "2024-06-01 00:00", "cost": 20}
+    }
+    # The stored month no longer answers for the month before
+    assert month_cost.response(date(2024, 5, 31)) == {}
+
+
+def test_month_cost_fetches_only_the_revised_days():
+    month_cost = MonthCost({})
+    month_cost.fetch_start(date(2024, 5, 10))
+    month_cost.merge(
+        {
+            f"2024-05-{day:02d}": {"localtime": f"2024-05-{day:02d} 00:00", "cost": 1}
+            for day in range(1, 11)
+        }
+    )
+
+    assert month_cost.fetch_start(date(2024, 5, 10)) == date(
+        2024, 5, 11 - REVISION_DAYS
+    )
+
+
+def test_is_final_hourly():
+    prices = SpotPriceCache({}, HOUR_SECONDS)
+    day = date(2024, 5, 1)
+    prices.merge({"data": _hours("2024-05-01", MIN_PRICES_PER_DAY - 1)}, [day])
+    assert not prices.is_final(day)
+
+    prices.merge({"data": _hours("2024-05-01", MIN_PRICES_PER_DAY)}, [day])
+    assert prices.is_final(day)
+    assert prices.missing_days([day, date(2024, 5, 2)]) == [date(2024, 5, 2)]
+
+
+def test_is_final_at_quarter_hours():
+    prices = SpotPriceCache({}, QUARTER_SECONDS)
+    day = date(2024, 5, 1)
+    quarters = {
+        f"2024-05-01 {index // 4:02d}:{index % 4 * 15:02d}": {
+            "localtime": f"2024-05-01 {index // 4:02d}:{index % 4 * 15:02d}",
+            "price": 100,
+        }
+        for index in range(MIN_PRICES_PER_DAY * 4)
+    }
+    # A day of hourly prices is not enough at quarter hours
+    prices.merge({"data": _hours("2024-05-01", 24)}, [day])
+    assert not prices.is_final(day)
+
+    prices.merge({"data": quarters}, [day])
+    assert prices.is_final(day)
+
+    last = max(quarters)
+    del quarters[last]
+    prices.merge({"data": quarters}, [day])
+    assert not prices.is_final(day)
+
+
+def test_days_stored_at_another_step_are_not_final():
+    data = {}
+    SpotPriceCache(data, HOUR_SECONDS).merge(
+        {"data": _hours("2024-05-01", 24)}, [date(2024, 5, 1)]
+    )
+
+    assert not SpotPriceCache(data, QUARTER_SECONDS).is_final(date(2024, 5, 1))
+    assert SpotPriceCache(data, HOUR_SECONDS).is_final(date(2024, 5, 1))
@@ -0,0 +1,68 @@
+"""Tests of the incremental decoding of Greenely responses."""
+
+import asyncio
+import json
+
+import pytest
+
+from custom_components.greenely.streaming import iter_data
+
+RESPONSE = (
+    '{"meta": {"unit": "Wh", "scale": -1.5e-3, "ok": true, "none": null},'
+    ' "data": {"1714514400": {"localtime": "2024-05-01 00:00", "usage": 1234.5},'
+    ' "1714518000": {"localtime": "2024-05-01 01:00", "usage": null},'
+    ' "1714521600": {"localtime": "2024-05-01 02:00", "usage": -12e2}},'
+    ' "total": 1e5, "count": 3}'
+)
+
+
+async def _chunks(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _decode(chunks) -> dict:
+    async def decode():
+        return {key: point async for key, point in iter_data(_chunks(chunks))}
+
+    return asyncio.run(decode())
+
+
+def _split(text: str, size: int) -> list[str]:
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16, len(RESPONSE)])
+def test_fixed_chunk_sizes(size):
+    assert _decode(_split(RESPONSE, size)) == json.loads(RESPONSE)["data"]
+
+
+def test_every_split_point():
+    expected = json.loads(RESPONSE)["data"]
+    for i in range(1, len(RESPONSE)):
+        assert _decode([RESPONSE[:i], RESPONSE[i:]]) == expected
+
+
+@pytest.mark.parametrize(
+    "chunks, expected",
+    [
+        (['{"data":{"a":1234.', "5}}"], {"a": 1234.5}),
+        (['{"data":{"a":12', "34}}"], {"a": 1234}),
+        (['{"data":{"a":1e', "5}}"], {"a": 1e5}),
+        (['{"data":{"a":1E+', "5}}"], {"a": 1e5}),
+        (['{"data":{"a":-', "1}}"], {"a": -1}),
+        (['{"data":{"a":1},"x":1e', "5}"], {"a": 1}),
+    ],
+)
+def test_number_cut_at_chunk_boundary(chunks, expected):
+    assert _decode(chunks) == expected
+
+
+def test_empty_data():
+    assert _decode(_split('{"data": {}, "x": 1}', 2)) == {}
+    assert _decode(["{}"]) == {}
+
+
+def test_truncated_response():
+    with pytest.raises(json.JSONDecodeError):
+        _decode(['{"data":{"a":1', "2"])